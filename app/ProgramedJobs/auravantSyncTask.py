@@ -0,0 +1,43 @@
+import schedule
+import time
+import logging
+import os
+from dotenv import load_dotenv
+
+from app.api.fields import sincronizarCatalogo
+from app.core.metrics import metrics
+
+
+# Configura logging para ver las ejecuciones
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Minutos entre sincronizaciones del catálogo de campos/lotes de Auravant
+AURAVANT_SYNC_MINUTES = int(os.getenv('AURAVANT_SYNC_MINUTES', '30'))
+
+
+def sincronizar():
+    """Copia incremental de getfields en auravant_fields / auravant_lots"""
+    inicio = time.perf_counter()
+    try:
+        sincronizarCatalogo()
+    except Exception as e:
+        logger.error(f"Error sincronizando catálogo Auravant: {e}")
+        return
+    logger.info(f"✅ Catálogo Auravant al día en {time.perf_counter() - inicio:.1f}s")
+
+
+schedule.every(AURAVANT_SYNC_MINUTES).minutes.do(sincronizar)
+# Resumen de tiempos SQL acumulados del proceso
+schedule.every().hour.do(metrics.log_summary)
+
+# Primera sincronización al arrancar
+sincronizar()
+
+logger.info(f"AuravantSyncTask iniciado - cada {AURAVANT_SYNC_MINUTES} minutos")
+
+while True:
+    schedule.run_pending()
+    time.sleep(1)
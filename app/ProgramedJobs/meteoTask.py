@@ -1,6 +1,5 @@
 import schedule
 import time
-import requests
 import pandas as pd
 import logging
 import ast
@@ -12,6 +11,11 @@ import psycopg2
 import os
 from dotenv import load_dotenv
 
+from app.core import open_meteo
+from app.core.metrics import metrics
+from app.models.parcel_registry import get_parcelas
+from app.models.meteo_forecast import MeteoForecastBuffer
+
 
 
 # Configura logging para ver las ejecuciones
@@ -20,129 +24,28 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-def get_db_connection():
-    """Conexión escalable a PostgreSQL"""
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST', ''),
-        port=os.getenv('DB_PORT', ''),
-        database=os.getenv('DB_NAME', ''),
-        user=os.getenv('DB_USER', ''),
-        password=os.getenv('DB_PASSWORD', '')
-    )
-
-def getParcelas4HistMeteo(id_parcela=None):
-    conn = get_db_connection()
-    try:
-
-        query = """
-            SELECT uid_parcel, coordinates_parcel
-            FROM parcels
-        """
-        params = []
-        
-        if id_parcela is not None:
-            query += " WHERE uid_parcel = %s"
-            params.append(id_parcela)
-
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params)
-            parcelas = cur.fetchall()  # ← Recupera TODAS las filas
-            return parcelas  # lista de dicts
-
-    except Exception as e:
-        conn.rollback()
-        print(f"Error en getParcelas4HistMeteo: {e}")
-        return []
-    finally:
-        conn.close()
-
-def save_meteo_forecast(uid_parcel: str, df: pd.DataFrame):
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            for _, row in df.iterrows():
-                cur.execute(
-                    """
-                    INSERT INTO meteo_forecast (
-                        uid_parcel,
-                        time,
-                        temperature,
-                        relative_humidity,
-                        precipitation,
-                        cloud_cover,
-                        wind_speed,
-                        wind_direction
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        uid_parcel,
-                        row["time"],
-                        row["temperature"],
-                        row["relative_humidity"],
-                        row["precipitation"],
-                        row["cloud_cover"],
-                        row["wind_speed"],
-                        row["wind_direction"]
-                    )
-                )
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
-
 
 
 def fetch_meteo_data(id_parcela=None):
     """Función que hace la llamada a Open-Meteo cada 15 min"""    
     print("**************************EEEEEEEEEENTROOOOO*************************")
-    parcelas = getParcelas4HistMeteo(id_parcela)
-
-    for row in parcelas:
-        uid = row["uid_parcel"]
-        coords = row["coordinates_parcel"]
-        coords_list = ast.literal_eval(coords)
-        lat=coords_list[0][0]
-        long=coords_list[0][1]
-
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": lat,
-            "longitude": long,
-            "current": "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m,wind_direction_10m",
-            "timezone": "auto"
-        }
-        
-        try:
-            r = requests.get(url, params=params)
-            r.raise_for_status()
-            data = r.json()
-            cur = data["current"]
-            
-            df = pd.DataFrame([{
-                "time": pd.to_datetime(cur["time"]),
-                "temperature": cur["temperature_2m"],
-                "relative_humidity": cur["relative_humidity_2m"],
-                "precipitation": cur["precipitation"],
-                "cloud_cover": cur["cloud_cover"],
-                "wind_speed": cur["wind_speed_10m"],
-                "wind_direction": cur["wind_direction_10m"]
-            }])
-            
-            # Aquí guardas los datos (base de datos, CSV, etc.)
-            # print(f"Datos obtenidos: {df.to_dict('records')}")
-        
-            save_meteo_forecast(uid, df)
-            
-        except Exception as e:
-            logger.error(f"Error en consulta meteo: {e}")
+    parcelas = get_parcelas(id_parcela)
+    inicio = time.perf_counter()
+
+    # Lotes de celdas pedidos en paralelo; el buffer escribe en bloque
+    with MeteoForecastBuffer() as buffer:
+        for registro in open_meteo.fetch_current(parcelas):
+            buffer.add(registro)
+
+    logger.info(f"✅ meteo_forecast: {buffer.escritas}/{len(parcelas)} parcelas en {time.perf_counter() - inicio:.1f}s")
 
 
 #fetch_meteo_data()
 
 # Programa la tarea cada 15 minutos
 schedule.every(180).minutes.do(fetch_meteo_data)
+# Resumen de tiempos SQL acumulados del proceso
+schedule.every().hour.do(metrics.log_summary)
 
 
 while True:
@@ -5,7 +5,7 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from models.convers import get_messages_by_conversation  # ← Reutilizamos
-from app.core.database import get_db_connection
+from app.core.database import db_connection
 from psycopg2.extras import RealDictCursor
 
 messages_bp = Blueprint('messages', __name__, url_prefix='/agrosync-api/chat')
@@ -64,8 +64,7 @@ def add_message(conversation_id):
         content = data.get('content')
         rol = data.get('rol', 'productor')
         
-        conn = get_db_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 # 1️⃣ CARGAR HISTORIAL (últimos 10 mensajes)
                 print("📚 Cargando historial...")
@@ -119,8 +118,6 @@ def add_message(conversation_id):
                 print(f"🚀 {len(new_messages)} nuevos msgs + {len(history)} contexto")
                 return jsonify(new_messages), 201
 
-        finally:
-            conn.close()
 
     except Exception as e:
         print(f"💥 ERROR: {e}")
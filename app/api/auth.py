@@ -1,10 +1,25 @@
 import requests
 import os
+import base64
+import json
+import logging
+import threading
+import time
 from flask import Blueprint, jsonify
 
+from app.core import upstream
+from app.core.limiter import get_limiter
+
 auth_bp = Blueprint('auth', __name__, url_prefix='/agrosync-api')
 
-def getToken():  # ← Ahora SÍ devuelve STRING
+logger = logging.getLogger(__name__)
+
+# Vida (s) del token si no trae claim exp, y margen (s) antes de caducar en que se renueva
+AURAVANT_TOKEN_TTL = int(os.getenv('AURAVANT_TOKEN_TTL', '3600'))
+AURAVANT_TOKEN_REFRESH_MARGIN = int(os.getenv('AURAVANT_TOKEN_REFRESH_MARGIN', '300'))
+
+
+def _pedirToken():
     userdata = {
         "username": os.getenv('AURAVANT_AUTH_USER', ''),
         "password": os.getenv('AURAVANT_AUTH_PASS', '')
@@ -13,13 +28,93 @@ def getToken():  # ← Ahora SÍ devuelve STRING
     #headers = {'SUBDOMAIN': os.getenv('SUBDOMAIN', ''), 'EXTENSION_ID': os.getenv('EXTENSION_ID', ''), 'SECRET': os.getenv('SECRET', '')}
 
     urlAuraAuth = os.getenv('AURAVANT_BASE_URL', 'https://api.auravant.com/api/') + 'auth'
-    
+
     #resp = requests.post(urlAuraAuth, data=userdata, headers=headers)
-    resp = requests.post(urlAuraAuth, data=userdata)
+    with get_limiter('auravant').slot() as slot:
+        resp = slot.check(requests.post(urlAuraAuth, data=userdata, timeout=upstream.UPSTREAM_TIMEOUT))
     if resp.status_code == 200:
         return resp.json().get("token")
     return None
 
+
+def _caducidad(token):
+    """Epoch de caducidad: claim exp si el token es un JWT, si no ahora + AURAVANT_TOKEN_TTL"""
+    try:
+        payload = token.split('.')[1]
+        exp = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))).get('exp')
+        if exp:
+            return float(exp)
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return time.time() + AURAVANT_TOKEN_TTL
+
+
+class _TokenAuravant:
+    """
+    Token Bearer de Auravant compartido por el proceso.
+
+    Se reutiliza hasta AURAVANT_TOKEN_REFRESH_MARGIN segundos antes de caducar;
+    en ese margen se renueva en segundo plano sin bloquear a nadie. Si no hay
+    token válido, las peticiones concurrentes esperan a una única renovación.
+    """
+
+    def __init__(self):
+        self._token = None
+        self._caduca = 0
+        self._renovando = False
+        self._lock = threading.Lock()
+
+    def _renovar(self):
+        # Llamar con self._lock tomado
+        token = _pedirToken()
+        if token:
+            self._token, self._caduca = token, _caducidad(token)
+        return token
+
+    def _renovar_en_segundo_plano(self):
+        try:
+            with self._lock:
+                if time.time() < self._caduca - AURAVANT_TOKEN_REFRESH_MARGIN:
+                    return
+                self._renovar()
+        except Exception as e:
+            logger.warning(f"⚠️ Renovación del token de Auravant fallida: {e}")
+        finally:
+            self._renovando = False
+
+    def get(self):
+        token, caduca = self._token, self._caduca
+        ahora = time.time()
+        if token and ahora < caduca - AURAVANT_TOKEN_REFRESH_MARGIN:
+            return token
+        if token and ahora < caduca:
+            if not self._renovando:
+                self._renovando = True
+                threading.Thread(target=self._renovar_en_segundo_plano, daemon=True).start()
+            return token
+        with self._lock:
+            # Otro hilo pudo renovarlo mientras esperábamos el lock
+            if self._token and time.time() < self._caduca:
+                return self._token
+            return self._renovar()
+
+    def invalidate(self):
+        """Descarta el token (p. ej. tras un 401 de Auravant)"""
+        with self._lock:
+            self._token, self._caduca = None, 0
+
+
+_token = _TokenAuravant()
+
+
+def getToken():  # ← Ahora SÍ devuelve STRING
+    return _token.get()
+
+
+def invalidateToken():
+    _token.invalidate()
+
+
 @auth_bp.route('/authtoken', methods=['POST'])
 def authtoken():
     token = getToken()
@@ -0,0 +1,40 @@
+import os
+
+from flask import Blueprint, jsonify, request
+
+from app.core import limiter
+from app.core.metrics import metrics
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/agrosync-api/debug')
+
+# /debug/* exige la cabecera X-Debug-Token (o ?token=) con este valor; sin definir, está desactivado
+DEBUG_METRICS_TOKEN = os.getenv('DEBUG_METRICS_TOKEN', '')
+
+
+@debug_bp.before_request
+def comprobar_token():
+    if not DEBUG_METRICS_TOKEN:
+        return jsonify({"success": False, "message": "Debug desactivado (DEBUG_METRICS_TOKEN)"}), 404
+    token = request.headers.get('X-Debug-Token') or request.args.get('token')
+    if token != DEBUG_METRICS_TOKEN:
+        return jsonify({"success": False, "message": "Token de debug inválido"}), 401
+
+
+@debug_bp.route('/metrics', methods=['GET'])
+def debug_metrics():
+    """Métricas del proceso de la API: queries SQL (latencia, filas, lentas) y contadores"""
+    return jsonify(metrics.snapshot()), 200
+
+
+@debug_bp.route('/metrics/reset', methods=['POST'])
+def debug_metrics_reset():
+    """Devuelve las métricas acumuladas y las reinicia"""
+    snapshot = metrics.snapshot()
+    metrics.reset()
+    return jsonify(snapshot), 200
+
+
+@debug_bp.route('/limits', methods=['GET'])
+def debug_limits():
+    """Límite adaptativo actual, peticiones en vuelo y recortes por proveedor externo"""
+    return jsonify(limiter.limits()), 200
@@ -1,22 +1,100 @@
 import requests
 import os
-from .auth import getToken  # ← Import específico
-from flask import Blueprint, request, jsonify
+import logging
+import threading
+from .auth import getToken, invalidateToken  # ← Import específico
+from flask import Blueprint, request, jsonify, make_response
+
+from app.core import upstream
+from app.core.limiter import get_limiter
+from app.core.singleflight import SingleFlight
+from app.models.auravant_catalogue import sync_catalogue, load_catalogue, catalogue_etag
 
 field_bp = Blueprint('fields', __name__, url_prefix='/agrosync-api')
 
-@field_bp.route('/getfields', methods=['POST'])  # ← GET, no POST
-def getfields():
+logger = logging.getLogger(__name__)
+
+# getfields y sincronizaciones simultáneas (job, refresh=1, altas/bajas) comparten una sola llamada
+auravant_flight = SingleFlight('auravant')
+
+
+def descargarCatalogo():
+    """getfields de Auravant → (json, status_code)"""
+    return auravant_flight.do('getfields', _descargarCatalogo)
+
+
+def _descargarCatalogo():
     token = getToken()
     if not token:
-        return jsonify({"error": "No token"}), 401
+        return {"error": "No token"}, 401
 
     urlAuragetFields = os.getenv('AURAVANT_BASE_URL', 'https://api.auravant.com/api/') + 'getfields'
     headers = {'Authorization': f'Bearer {token}'}
-    
-    resp = requests.get(urlAuragetFields, headers=headers)  # ← GET
-    
-    return jsonify(resp.json()), resp.status_code
+
+    with get_limiter('auravant').slot() as slot:
+        resp = slot.check(requests.get(urlAuragetFields, headers=headers, timeout=upstream.UPSTREAM_TIMEOUT))  # ← GET
+    if resp.status_code == 401:
+        invalidateToken()  # Token revocado: la próxima petición pide otro
+    return resp.json(), resp.status_code
+
+
+def sincronizarCatalogo():
+    """Descarga getfields y actualiza la copia local (auravant_fields / auravant_lots)"""
+    return auravant_flight.do('sync', _sincronizarCatalogo)
+
+
+def _sincronizarCatalogo(descargar=descargarCatalogo):
+    payload, status = descargar()
+    if status != 200:
+        raise RuntimeError(f"getfields respondió {status}: {str(payload)[:200]}")
+    stats = sync_catalogue(payload)
+    logger.info(f"🔄 Catálogo Auravant sincronizado: campos {stats['fields']}, lotes {stats['lots']}")
+    return stats
+
+
+def _sincronizarEnSegundoPlano():
+    def tarea():
+        try:
+            # Sin agrupar: una llamada ya en vuelo pudo empezar antes del cambio
+            _sincronizarCatalogo(_descargarCatalogo)
+        except Exception as e:
+            logger.error(f"Error sincronizando catálogo Auravant: {e}")
+    threading.Thread(target=tarea, daemon=True).start()
+
+
+@field_bp.route('/getfields', methods=['GET', 'POST'])
+def getfields():
+    """
+    Campos y lotes desde la copia local (la mantiene auravantSyncTask).
+
+    Opciones (query string o JSON): refresh=1 sincroniza antes de responder,
+    source=auravant consulta Auravant directamente. Responde con ETag y
+    devuelve 304 si coincide con If-None-Match. Si aún no hay copia local y
+    la sincronización falla, hace de proxy directo a Auravant como antes.
+    """
+    opciones = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+    if opciones.get('source') == 'auravant':
+        payload, status = descargarCatalogo()
+        return jsonify(payload), status
+
+    etag = catalogue_etag()
+    if etag is None or str(opciones.get('refresh', '')).lower() in ('1', 'true'):
+        try:
+            etag = sincronizarCatalogo()['etag']
+        except Exception as e:
+            logger.error(f"Error sincronizando catálogo Auravant: {e}")
+            if etag is None:
+                payload, status = descargarCatalogo()
+                return jsonify(payload), status
+
+    if request.if_none_match.contains(etag):
+        resp = make_response('', 304)
+    else:
+        payload, etag = load_catalogue()
+        resp = jsonify(payload)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
 
 
 '''
@@ -80,8 +158,13 @@ def agregarlote():
     }
     
     
-    resp = requests.post(urlAuragetFields, headers=headers, data=userdata)  # ← GET
-    
+    with get_limiter('auravant').slot() as slot:
+        resp = slot.check(requests.post(urlAuragetFields, headers=headers, data=userdata, timeout=upstream.UPSTREAM_TIMEOUT))
+    if resp.status_code == 200:
+        _sincronizarEnSegundoPlano()  # La copia local refleja el lote nuevo
+
+    if resp.status_code == 401:
+        invalidateToken()  # Token revocado: la próxima petición pide otro
     return jsonify(resp.json()), resp.status_code
 
 
@@ -96,7 +179,13 @@ def eliminarlote():
     urlAuragetFields = os.getenv('AURAVANT_AUTH_URL', 'https://api.auravant.com/api/') + 'borrarlotes' + "?lote=" + idField
     headers = {'Authorization': f'Bearer {token}'}
     
-    resp = requests.get(urlAuragetFields, headers=headers)
+    with get_limiter('auravant').slot() as slot:
+        resp = slot.check(requests.get(urlAuragetFields, headers=headers, timeout=upstream.UPSTREAM_TIMEOUT))
+    if resp.status_code == 200:
+        _sincronizarEnSegundoPlano()  # La copia local refleja el borrado
+
+    if resp.status_code == 401:
+        invalidateToken()  # Token revocado: la próxima petición pide otro
     return jsonify(resp.json()), resp.status_code
 
 
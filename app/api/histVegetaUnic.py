@@ -10,6 +10,10 @@ import psycopg2
 import os
 from dotenv import load_dotenv
 
+from app.core.limiter import get_limiter
+from app.models.parcel_registry import get_parcelas
+from app.models.vegetation_indices import save_indices_to_db
+
 
 import time
 from datetime import datetime
@@ -25,113 +29,6 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-def get_db_connection():
-    """Conexión escalable a PostgreSQL"""
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST', ''),
-        port=os.getenv('DB_PORT', ''),
-        database=os.getenv('DB_NAME', ''),
-        user=os.getenv('DB_USER', ''),
-        password=os.getenv('DB_PASSWORD', '')
-    )
-
-def getParcelas4HistMeteo(id_parcela=None):
-    conn = get_db_connection()
-    try:
-
-        query = """
-            SELECT uid_parcel, coordinates_parcel
-            FROM parcels
-        """
-        params = []
-        
-        if id_parcela is not None:
-            query += " WHERE uid_parcel = %s"
-            params.append(id_parcela)
-
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params)
-            parcelas = cur.fetchall()  # ← Recupera TODAS las filas
-            return parcelas  # lista de dicts
-
-    except Exception as e:
-        conn.rollback()
-        print(f"Error en getParcelas4HistMeteo: {e}")
-        return []
-    finally:
-        conn.close()
-
-def convertirArrayCoordenadasEnPoligono(coords):
-    """
-    Convierte [[lat1, lon1], [lat2, lon2], ...] a 'POLYGON((lon1 lat1, lon2 lat2, ...))'
-    
-    Args:
-        coords: list de [lat, lon] como lo recibe de fullstack
-    
-    Returns:
-        str en formato WKT para Auravant API
-    """
-    if not coords or len(coords) < 3:
-        raise ValueError("El polígono necesita al menos 3 coordenadas")
-    
-    # Extrae lon lat (invierte orden) y formatea
-    pairs = [f"{lon} {lat}" for lat, lon in coords]
-    
-    # Asegura cierre (primer punto == último)
-    if pairs[0] != pairs[-1]:
-        pairs.append(pairs[0])
-    
-    return f"POLYGON(({', '.join(pairs)}))"
-
-
-def save_indices_to_db(df: pd.DataFrame):
-    """
-    Inserta el DataFrame en la tabla parcel_vegetation_indices.
-    Solo inserta un registro si no existe exactamente la misma fila.
-    """
-
-    if df.empty:
-        logger.info("⚠️ DataFrame vacío. Nada que insertar.")
-        return
-
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-
-            insert_sql = """
-                INSERT INTO parcel_vegetation_indices (uid_parcel, fecha, ndvi, gndvi, ndwi, savi)
-                SELECT %s, %s, %s, %s, %s, %s
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM parcel_vegetation_indices
-                    WHERE uid_parcel = %s
-                      AND fecha = %s
-                      AND ndvi = %s
-                      AND gndvi = %s
-                      AND ndwi = %s
-                      AND savi = %s
-                );
-            """
-
-            values = [
-                (
-                    row['Field'], row['Fecha'], row['NDVI'], row['GNDVI'], row['NDWI'], row['SAVI'],  # para INSERT
-                    row['Field'], row['Fecha'], row['NDVI'], row['GNDVI'], row['NDWI'], row['SAVI']   # para WHERE NOT EXISTS
-                )
-                for _, row in df.iterrows()
-            ]
-
-            cur.executemany(insert_sql, values)
-            conn.commit()
-
-            logger.info(f"✅ Insertadas {cur.rowcount} filas en parcel_vegetation_indices (sin duplicados exactos)")
-
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"❌ Error insertando índices en DB: {e}")
-
-    finally:
-        conn.close()
-
 
 
 
@@ -173,14 +70,14 @@ def leerYGuardarVegetacionIndices(id_parcela=None):
     # 2) FINCAS (WKT)
     # --------------------------------------------------
     
-    parcelasDB = getParcelas4HistMeteo(id_parcela);
+    parcelasDB = get_parcelas(id_parcela);
     parcelasTratadas = {}
     for row in parcelasDB:
         uid = row["uid_parcel"]
-        coords = row["coordinates_parcel"]
-        coords_list = ast.literal_eval(coords)
-        wktCoords = convertirArrayCoordenadasEnPoligono(coords_list)
-        parcelasTratadas[uid] = wktCoords
+        if row["wkt"] is None:
+            logger.warning(f"⚠️ Parcela {uid} sin polígono (menos de 3 vértices): se omite")
+            continue
+        parcelasTratadas[uid] = row["wkt"]
 
 
 
@@ -231,7 +128,8 @@ def leerYGuardarVegetacionIndices(id_parcela=None):
         .map(add_indices)
     )
 
-    print(f"🔍 {s2.size().getInfo()} imágenes encontradas")
+    with get_limiter('earthengine').slot():
+        print(f"🔍 {s2.size().getInfo()} imágenes encontradas")
 
 
     # --------------------------------------------------
@@ -254,7 +152,8 @@ def leerYGuardarVegetacionIndices(id_parcela=None):
     # 7) A CSV
     # --------------------------------------------------
     print("Descargando datos desde Google Earth Engine...")
-    data = results.getInfo()
+    with get_limiter('earthengine').slot():
+        data = results.getInfo()
 
     rows = []
     for f in data['features']:
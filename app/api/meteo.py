@@ -1,6 +1,10 @@
-import requests
 import pandas as pd
 from flask import Blueprint, request, jsonify
+from app.core import open_meteo, upstream
+from app.core.alert_rules import add_alerts, alerts_to_records
+from app.core.cache import TTLCache
+from app.core.limiter import LimiterTimeout
+from app.core.singleflight import SingleFlight
 from models.field import getParcelas4HistMeteo
 from . import meteoUnic
 from . import histVegetaUnic
@@ -9,9 +13,27 @@ from . import alertasUnic
 import ast
 import traceback
 import logging
+import os
 
 meteo_bp = Blueprint('meteo', __name__, url_prefix='/agrosync-api')
 
+# El "current" de Open-Meteo cambia cada 15 min: se cachea por coordenada redondeada
+# hasta el siguiente corte (+ margen para que el proveedor publique)
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv('FORECAST_CACHE_MAX_ENTRIES', '2048'))
+FORECAST_CACHE_INTERVAL = int(os.getenv('FORECAST_CACHE_INTERVAL', '900'))
+FORECAST_CACHE_OFFSET = int(os.getenv('FORECAST_CACHE_OFFSET', '60'))
+# Decimales de lat/lon en la clave (2 ≈ 1 km, por debajo de la rejilla del modelo)
+FORECAST_CACHE_PRECISION = int(os.getenv('FORECAST_CACHE_PRECISION', '2'))
+
+forecast_cache = TTLCache(
+    'forecast_cache',
+    max_entries=FORECAST_CACHE_MAX_ENTRIES,
+    interval=FORECAST_CACHE_INTERVAL,
+    offset=FORECAST_CACHE_OFFSET
+)
+# Fallos de caché simultáneos para la misma coordenada → una sola llamada a Open-Meteo
+forecast_flight = SingleFlight('forecast')
+
 @meteo_bp.route('/alertas_tiempo_parcela', methods=['POST'])
 def alertas_tiempo_parcela():
     try:
@@ -25,6 +47,9 @@ def alertas_tiempo_parcela():
         alertasUnic.calcular_y_guardar_alertas(idParcela)
         print("retornamos OK")
         return "OK"
+    except LimiterTimeout:
+        # Lo traduce a 503 el errorhandler de la app
+        raise
     except Exception:
         logging.error(traceback.format_exc())
         return "KO", 500
@@ -42,16 +67,22 @@ def forecast():
 
 
 def getForcasByLatLong(lat, lon):
-    url = "https://api.open-meteo.com/v1/forecast"
+    lat = round(float(lat), FORECAST_CACHE_PRECISION)
+    lon = round(float(lon), FORECAST_CACHE_PRECISION)
+    return forecast_cache.get_or_load(
+        (lat, lon), lambda: forecast_flight.do((lat, lon), lambda: _fetch_forecast(lat, lon))
+    )
 
+
+def _fetch_forecast(lat, lon):
     params = {
         "latitude": lat,
         "longitude": lon,
-        "current": "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m,wind_direction_10m",
+        "current": open_meteo.CURRENT_VARIABLES,
         "timezone": "auto"
     }
 
-    r = requests.get(url, params=params)
+    r = upstream.get(open_meteo.FORECAST_URL, params=params)
     r.raise_for_status()
     data = r.json()
 
@@ -80,49 +111,10 @@ def getForcasByLatLong(lat, lon):
 @meteo_bp.route('/forecast_nextweek', methods=['POST'])
 def forecast_nextweek():
     
-    all_data = []
-
     parcelas = getParcelas4HistMeteo()
 
-    for row in parcelas:
-        uid_parcel = row["uid_parcel"]
-        coords = row["coordinates_parcel"]
-        coords_list = ast.literal_eval(coords)
-        lat=coords_list[0][0]
-        long=coords_list[0][1]        
-        
-        url = "https://api.open-meteo.com/v1/forecast"
-
-        params = {
-            "latitude": lat,
-            "longitude": long,
-            "daily": (
-                "temperature_2m_max,temperature_2m_min,"
-                "precipitation_sum,relative_humidity_2m_max,"
-                "relative_humidity_2m_min"
-            ),
-            "timezone": "auto"
-        }
-        
-        r = requests.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
-
-        daily = data["daily"]
-
-        df = pd.DataFrame({
-            "uid_parcel": uid_parcel,
-            "date": pd.to_datetime(daily["time"]),
-            "temp_max": daily["temperature_2m_max"],
-            "temp_min": daily["temperature_2m_min"],
-            "rain": daily["precipitation_sum"],
-            "humidity_max": daily["relative_humidity_2m_max"],
-            "humidity_min": daily["relative_humidity_2m_min"]
-        })
-
-        all_data.append(df)
-
-    df_all = pd.concat(all_data, ignore_index=True)
+    # Una petición por lote de celdas de rejilla; se calcula por celda y se reparte al final
+    df_all, celdas = open_meteo.fetch_daily_forecast(parcelas, por_celda=True)
 
     # ---------- FEATURES ----------
 
@@ -160,88 +152,13 @@ def forecast_nextweek():
         .reset_index(level=0, drop=True)
     )
     print(df_all)    
-    dfDatosConAlertas = add_alerts(df_all)
+    dfDatosConAlertas = open_meteo.fan_out(add_alerts(df_all), celdas)
     print(dfDatosConAlertas.columns)
     print("dfDatosConAlertas: ")
     print(dfDatosConAlertas)
-    data = dfDatosConAlertas.copy()
+    # Alertas categóricas → None (JSON válido, sin NaN)
+    data = alerts_to_records(dfDatosConAlertas)
     data["date"] = data["date"].astype(str)
 
     json_data = data.to_dict(orient="records")
     return json_data
-
-
-# FUNCIÓN ALERTA HELADA
-
-def riesgo_helada(row):
-    score = 0
-
-    # Temperatura mínima crítica
-    if row["temp_min"] <= 0:
-        score += 2   # helada directa
-
-    elif row["temp_min"] <= 2:
-        score += 1   # riesgo leve
-
-    # Tendencia fría
-    if row["temp_7d_mean"] <= 5:
-        score += 1
-
-    if score >= 3:
-        return "ALTO"
-    elif score == 2:
-        return "MEDIO"
-    else:
-        return None
-
-# FUNCIÓN ALERTA INUNDACIÓN
-
-def riesgo_inundacion(row):
-    score = 0
-
-    if row["rain_3d_sum"] >= 40:
-        score += 2
-    elif row["rain_3d_sum"] >= 20:
-        score += 1
-
-    if row["rain_7d_sum"] >= 80:
-        score += 1
-
-    if row["humidity_mean"] >= 85:
-        score += 1
-
-    if score >= 3:
-        return "ALTO"
-    elif score == 2:
-        return "MEDIO"
-    else:
-        return None
-
-# FUNCIÓN ALERTA PLAGA
-
-def riesgo_plaga(row):
-    score = 0
-
-    if row["humidity_3d_mean"] >= 80:
-        score += 1
-    if 15 <= row["temp_7d_mean"] <= 28:
-        score += 1
-    if row["rain_3d_sum"] >= 5:
-        score += 1
-
-    if score == 3:
-        return "ALTO"
-    elif score == 2:
-        return "MEDIO"
-    else:
-        return None
-
-# FUNCIÓN EJECUTAR ALERTAS
-
-def add_alerts(df):
-
-    df["alerta_helada"] = df.apply(riesgo_helada, axis=1)
-    df["alerta_inundacion"] = df.apply(riesgo_inundacion, axis=1)
-    df["alerta_plaga"] = df.apply(riesgo_plaga, axis=1)
-
-    return df
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Reglas de alertas meteorológicas (helada, inundación, plaga) como datos.
+
+Cada regla suma puntos por criterio y el total se traduce a un nivel. Un
+criterio es una columna con tramos (operador, umbral, puntos) evaluados como
+if/elif: cuenta el primero que se cumple. Los niveles son (puntos mínimos,
+etiqueta), de mayor a menor; por debajo del último no hay alerta (None).
+
+Todo se evalúa por columnas con NumPy (np.select), sin Python por fila, y
+cada alerta sale como columna categórica ordenada (MEDIO < ALTO). Una
+alerta nueva es una entrada más en ALERT_RULES.
+"""
+import numpy as np
+import pandas as pd
+
+ALERT_LEVELS = pd.CategoricalDtype(['MEDIO', 'ALTO'], ordered=True)
+
+_OPERADORES = {
+    '<=': lambda x, u: x <= u,
+    '<': lambda x, u: x < u,
+    '>=': lambda x, u: x >= u,
+    '>': lambda x, u: x > u,
+    'between': lambda x, u: (x >= u[0]) & (x <= u[1]),
+}
+
+ALERT_RULES = {
+    'alerta_helada': {
+        'criterios': [
+            ('temp_min', [('<=', 0, 2),             # helada directa
+                          ('<=', 2, 1)]),           # riesgo leve
+            ('temp_7d_mean', [('<=', 5, 1)]),       # tendencia fría
+        ],
+        'niveles': [(3, 'ALTO'), (2, 'MEDIO')],
+    },
+    'alerta_inundacion': {
+        'criterios': [
+            ('rain_3d_sum', [('>=', 40, 2), ('>=', 20, 1)]),
+            ('rain_7d_sum', [('>=', 80, 1)]),
+            ('humidity_mean', [('>=', 85, 1)]),
+        ],
+        'niveles': [(3, 'ALTO'), (2, 'MEDIO')],
+    },
+    'alerta_plaga': {
+        'criterios': [
+            ('humidity_3d_mean', [('>=', 80, 1)]),
+            ('temp_7d_mean', [('between', (15, 28), 1)]),
+            ('rain_3d_sum', [('>=', 5, 1)]),
+        ],
+        'niveles': [(3, 'ALTO'), (2, 'MEDIO')],
+    },
+}
+
+
+def rule_score(df, criterios):
+    """Puntos de cada fila (NaN no cumple ningún umbral, como en la comparación fila a fila)"""
+    total = np.zeros(len(df), dtype=np.int16)
+    for columna, tramos in criterios:
+        valores = df[columna].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            condiciones = [_OPERADORES[op](valores, umbral) for op, umbral, _ in tramos]
+        total += np.select(condiciones, [puntos for _, _, puntos in tramos], default=0).astype(np.int16)
+    return total
+
+
+def rule_level(score, niveles):
+    """Puntos → categórica ALERT_LEVELS (NaN = sin alerta)"""
+    codigos = np.select(
+        [score >= minimo for minimo, _ in niveles],
+        [ALERT_LEVELS.categories.get_loc(etiqueta) for _, etiqueta in niveles],
+        default=-1
+    )
+    return pd.Categorical.from_codes(codigos, dtype=ALERT_LEVELS)
+
+
+def add_alerts(df, rules=None):
+    """Añade una columna categórica por regla (alerta_helada, alerta_inundacion, alerta_plaga)"""
+    for columna, regla in (ALERT_RULES if rules is None else rules).items():
+        df[columna] = rule_level(rule_score(df, regla['criterios']), regla['niveles'])
+    return df
+
+
+def alerts_to_records(df, columnas=None):
+    """Copia con las alertas como object y None en vez de NaN (para JSON / BBDD)"""
+    columnas = [c for c in (columnas or ALERT_RULES) if c in df.columns]
+    df = df.copy()
+    for columna in columnas:
+        df[columna] = df[columna].astype(object).where(df[columna].notna(), None)
+    return df
@@ -0,0 +1,93 @@
+"""
+Caché en memoria con TTL y expulsión LRU.
+
+Pensada para datos del proveedor que cambian a intervalos fijos (el "current"
+de Open-Meteo se recalcula cada 15 minutos): las entradas caducan en el
+siguiente corte del intervalo, no N segundos después de pedirlas. Durante
+max_stale segundos tras caducar se sigue sirviendo el valor viejo mientras
+un hilo en segundo plano lo refresca (stale-while-revalidate).
+
+    cache = TTLCache('forecast', max_entries=1024, interval=900)
+    valor = cache.get_or_load((lat, lon), lambda: pedir_a_la_api(lat, lon))
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def next_boundary(interval, offset=0, now=None):
+    """Siguiente instante (epoch) múltiplo de interval, desplazado offset segundos"""
+    now = time.time() if now is None else now
+    return (int((now - offset) // interval) + 1) * interval + offset
+
+
+class TTLCache:
+
+    def __init__(self, name, max_entries=1024, interval=900, offset=0, max_stale=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.interval = interval
+        self.offset = offset
+        self.max_stale = interval if max_stale is None else max_stale
+        self._entradas = OrderedDict()  # key -> (valor, caduca)
+        self._refrescando = set()
+        self._lock = threading.Lock()
+
+    def _guardar(self, key, valor):
+        with self._lock:
+            self._entradas[key] = (valor, next_boundary(self.interval, self.offset))
+            self._entradas.move_to_end(key)
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+
+    def _refrescar(self, key, loader):
+        try:
+            self._guardar(key, loader())
+        except Exception as e:
+            # Se queda el valor viejo; el siguiente acceso lo volverá a intentar
+            logger.warning(f"⚠️ {self.name}: refresco en segundo plano fallido para {key}: {e}")
+        finally:
+            with self._lock:
+                self._refrescando.discard(key)
+
+    def get_or_load(self, key, loader):
+        """
+        Valor de key; si no está (o caducó hace más de max_stale) se llama a
+        loader() y se guarda. Un valor caducado reciente se devuelve tal cual
+        y se refresca en segundo plano.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada is not None:
+                valor, caduca = entrada
+                self._entradas.move_to_end(key)
+                if ahora < caduca:
+                    metrics.incr(f'{self.name}.hit')
+                    return valor
+                if ahora < caduca + self.max_stale:
+                    metrics.incr(f'{self.name}.stale')
+                    if key not in self._refrescando:
+                        self._refrescando.add(key)
+                        threading.Thread(target=self._refrescar, args=(key, loader), daemon=True).start()
+                    return valor
+        metrics.incr(f'{self.name}.miss')
+        valor = loader()
+        self._guardar(key, valor)
+        return valor
+
+    def invalidate(self, key=None):
+        """Borra key (o todo si key es None)"""
+        with self._lock:
+            if key is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(key, None)
+
+    def __len__(self):
+        return len(self._entradas)
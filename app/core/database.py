@@ -1,16 +1,209 @@
-import psycopg2
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2 import extensions, pool
 from dotenv import load_dotenv
 
+from app.core.metrics import InstrumentedCursorMixin
+
 load_dotenv()
 
-def get_db_connection():
-    """Conexión escalable a PostgreSQL"""
-    print("entra en get_db_connection()")
-    return psycopg2.connect(
+# Tamaño del pool por proceso (API y cada ProgramedJob tienen el suyo).
+# psycopg2 mantiene abiertas como mucho DB_POOL_MIN conexiones ociosas; las demás se cierran al devolverse.
+# Por defecto 1: los jobs son de un solo hilo; la API lo sube con API_DB_POOL_MIN (docker-entrypoint.sh).
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+# Segundos que espera un hilo por una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Conexiones ociosas más de estos segundos se validan con SELECT 1 al prestarse
+DB_POOL_HEALTHCHECK_SECS = float(os.getenv('DB_POOL_HEALTHCHECK_SECS', '30'))
+# Filas que trae cada viaje del cursor de servidor en stream_frames
+DB_STREAM_CHUNK_ROWS = int(os.getenv('DB_STREAM_CHUNK_ROWS', '50000'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used = {}
+
+
+_cursor_classes = {}
+
+
+def _instrumented(factory):
+    clase = _cursor_classes.get(factory)
+    if clase is None:
+        clase = _cursor_classes[factory] = type(f"Instrumented{factory.__name__}", (InstrumentedCursorMixin, factory), {})
+    return clase
+
+
+class InstrumentedConnection(extensions.connection):
+    """Conexión cuyos cursores (de cualquier cursor_factory) registran latencia y filas en metrics"""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _instrumented(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def _connect_kwargs():
+    return dict(
+        connection_factory=InstrumentedConnection,
         host=os.getenv('DB_HOST', ''),
         port=os.getenv('DB_PORT', ''),
         database=os.getenv('DB_NAME', ''),
         user=os.getenv('DB_USER', ''),
         password=os.getenv('DB_PASSWORD', '')
-    )
\ No newline at end of file
+    )
+
+
+def get_pool():
+    """Pool de conexiones PostgreSQL compartido por todo el proceso"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **_connect_kwargs())
+    return _pool
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_SECS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _acquire():
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise pool.PoolError(f"Sin conexiones libres tras {DB_POOL_TIMEOUT}s (DB_POOL_MAX={DB_POOL_MAX})")
+    try:
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        if not _is_healthy(conn):
+            # Conexión caída (reinicio de Postgres, timeout de red...): se descarta y se abre otra
+            db_pool.putconn(conn, close=True)
+            _last_used.pop(id(conn), None)
+            conn = db_pool.getconn()
+        return conn
+    except Exception:
+        _slots.release()
+        raise
+
+
+def _release(conn):
+    try:
+        broken = bool(conn.closed)
+        if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            # Lo que no se haya commiteado explícitamente no se arrastra al siguiente usuario
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        if broken:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        get_pool().putconn(conn, close=broken)
+    finally:
+        _slots.release()
+
+
+@contextmanager
+def db_connection():
+    """
+    Presta una conexión del pool y la devuelve al salir del bloque.
+    El commit sigue siendo explícito; lo pendiente se descarta con rollback.
+
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                ...
+            conn.commit()
+    """
+    conn = _acquire()
+    try:
+        yield conn
+    finally:
+        _release(conn)
+
+
+def filtro_parcelas_fechas(columna_fecha, parcelas=None, desde=None, hasta=None):
+    """WHERE + parámetros para acotar por parcela(s) (uid_parcel) y rango de fechas en SQL"""
+    filtros = []
+    params = {}
+    if parcelas is not None:
+        if isinstance(parcelas, str):
+            parcelas = [parcelas]
+        filtros.append("uid_parcel = ANY(%(parcelas)s)")
+        params["parcelas"] = list(parcelas)
+    if desde is not None:
+        filtros.append(f'{columna_fecha} >= %(desde)s')
+        params["desde"] = pd.Timestamp(desde).date()
+    if hasta is not None:
+        filtros.append(f'{columna_fecha} <= %(hasta)s')
+        params["hasta"] = pd.Timestamp(hasta).date()
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    return where, params
+
+
+def stream_frames(query, params=None, group_column=None, chunk_rows=DB_STREAM_CHUNK_ROWS):
+    """
+    Ejecuta query con un cursor con nombre (del lado del servidor) y va
+    devolviendo DataFrames de unas chunk_rows filas, sin cargar el resultado
+    entero en memoria.
+
+    Con group_column (la query debe venir ordenada por esa columna) un grupo
+    nunca se parte entre dos DataFrames: cada chunk contiene grupos completos.
+
+        for chunk in stream_frames(query, params, group_column='field'):
+            ...
+    """
+    with db_connection() as conn:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.execute(query, params)
+            pendientes = []
+            while True:
+                filas = cur.fetchmany(chunk_rows)
+                if not filas:
+                    break
+                columnas = [d[0] for d in cur.description]
+                pendientes.extend(filas)
+                corte = len(pendientes)
+                if group_column is not None:
+                    # El último grupo puede seguir en el siguiente viaje: se guarda para entonces
+                    pos = columnas.index(group_column)
+                    ultimo = pendientes[-1][pos]
+                    while corte > 0 and pendientes[corte - 1][pos] == ultimo:
+                        corte -= 1
+                if corte > 0:
+                    yield pd.DataFrame(pendientes[:corte], columns=columnas)
+                    pendientes = pendientes[corte:]
+            if pendientes:
+                yield pd.DataFrame(pendientes, columns=columnas)
+
+
+def connect_unpooled():
+    """Conexión dedicada fuera del pool (LISTEN/NOTIFY y otros usos de larga duración)"""
+    return psycopg2.connect(**_connect_kwargs())
+
+
+def close_pool():
+    """Cierra todas las conexiones del pool (fin de proceso / tests)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
@@ -0,0 +1,200 @@
+"""
+Cálculos vectorizados del pipeline de sequía (alertasUnic / alertasTask).
+
+Todas las funciones trabajan sobre el frame completo ordenado por
+(parcela, fecha) y respetan los límites entre parcelas: una ventana nunca
+mezcla días de dos parcelas distintas.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.core.database import DB_STREAM_CHUNK_ROWS
+
+# Escalas (días) de SPI soportadas por defecto
+SPI_SCALES = (30, 60, 90)
+
+# Severidad final como categórica ordenada (Mild < Moderate < Severe)
+SEVERITY_LEVELS = pd.CategoricalDtype(['Mild', 'Moderate', 'Severe'], ordered=True)
+# Severidad de suelo (0 sin sequía, 1 moderada, 2 severa) en la escala de clima
+_SOIL_SEVERITY_SCALED = np.array([0, 2, 3])
+# Puntos de confianza extra por nivel de severidad (Mild, Moderate, Severe)
+_CONFIDENCE_BY_SEVERITY = np.array([0, 10, 20])
+
+# Procesos para las features de clima (1 = sin pool) y filas mínimas para repartir
+DROUGHT_WORKERS = int(os.getenv('DROUGHT_WORKERS', '1'))
+DROUGHT_PARALLEL_MIN_ROWS = int(os.getenv('DROUGHT_PARALLEL_MIN_ROWS', '200000'))
+
+
+def climate_chunk_rows(workers=None):
+    """
+    Filas por bloque al leer el clima: con DROUGHT_WORKERS > 1 los bloques
+    llegan al menos a DROUGHT_PARALLEL_MIN_ROWS, para que el reparto entre
+    procesos llegue a usarse; con 1 worker, DB_STREAM_CHUNK_ROWS.
+    """
+    workers = DROUGHT_WORKERS if workers is None else workers
+    if workers <= 1:
+        return DB_STREAM_CHUNK_ROWS
+    return max(DB_STREAM_CHUNK_ROWS, DROUGHT_PARALLEL_MIN_ROWS)
+
+
+def _posicion_en_grupo(grupos):
+    """Posición de cada fila dentro de su grupo (grupos contiguos)"""
+    grupos = np.asarray(grupos)
+    n = len(grupos)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    inicio = np.r_[True, grupos[1:] != grupos[:-1]]
+    indices_inicio = np.flatnonzero(inicio)
+    return np.arange(n) - np.repeat(indices_inicio, np.diff(np.r_[indices_inicio, n]))
+
+
+def spi_values(valores, grupos=None, scale=30):
+    """
+    SPI simplificado: (x[i] - media) / std de los scale valores anteriores
+    de la misma parcela (std poblacional). std 0 (o ventana con NaN) → 0;
+    las primeras scale filas de cada parcela → NaN.
+
+    Es la misma definición que el bucle original, en una sola pasada: las
+    medias y varianzas móviles se calculan sobre todo el array desplazado un
+    día y se anulan las filas cuya ventana cruzaría el inicio de la parcela.
+    """
+    x = pd.Series(np.asarray(valores, dtype=float))
+    anterior = x.shift(1).rolling(scale, min_periods=scale)
+    media = anterior.mean().to_numpy()
+    std = anterior.std(ddof=0).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spi = np.where(std > 0, (x.to_numpy() - media) / std, 0.0)
+    posicion = np.arange(len(x)) if grupos is None else _posicion_en_grupo(grupos)
+    spi[posicion < scale] = np.nan
+    return spi
+
+
+def add_spi(df, column='precipitation_sum', group='field', scales=(30,)):
+    """Añade SPI_<scale> por cada escala; df debe venir ordenado por (group, fecha)"""
+    for scale in scales:
+        df[f'SPI_{scale}'] = spi_values(df[column].to_numpy(), df[group].to_numpy(), scale)
+    return df
+
+
+def nearest_by_group(left, right, on, by, columns, tolerance, right_on=None, right_by=None):
+    """
+    Añade a left las columns de la fila de right más cercana en fecha, de su
+    mismo grupo y como mucho a tolerance de distancia (NaN si no hay ninguna).
+
+    Equivale a buscar, fila a fila, la fecha con menor |diferencia| dentro de
+    la tolerancia: a igual distancia gana la fecha anterior, y si right repite
+    fecha gana la primera. Se hace con merge_asof (ordenado por fecha) y se
+    devuelve left en su orden original.
+    """
+    right_on = right_on or on
+    right_by = right_by or by
+    derecha = (
+        right[[right_by, right_on] + list(columns)]
+        .drop_duplicates([right_by, right_on], keep='first')
+        .rename(columns={right_by: '_by', right_on: '_on'})
+    )
+    derecha['_on'] = derecha['_on'].astype('datetime64[ns]')
+    derecha = derecha.sort_values('_on', kind='stable')
+
+    izquierda = left.drop(columns=[c for c in columns if c in left.columns])
+    claves = pd.DataFrame({
+        '_orden': np.arange(len(left)),
+        '_by': left[by].to_numpy(),
+        '_on': left[on].astype('datetime64[ns]').to_numpy(),
+    }).sort_values('_on', kind='stable')
+
+    cruce = pd.merge_asof(
+        claves, derecha, on='_on', by='_by',
+        direction='nearest', tolerance=pd.Timedelta(tolerance)
+    ).sort_values('_orden')
+
+    resultado = izquierda.copy()
+    for columna in columns:
+        resultado[columna] = cruce[columna].to_numpy(dtype=float)
+    return resultado
+
+
+def climate_features(df):
+    """
+    Features de clima por parcela en una pasada sobre el frame ordenado por
+    (field, time): lluvia acumulada 30/90 días, temperatura media 30 días,
+    SPI_30, sequía binaria y severidad (0 sin dato, 1 Mild, 2 Moderate, 3 Severe).
+    """
+    por_parcela = df.groupby('field', sort=False)
+
+    # Rolling por parcela (las ventanas no cruzan parcelas); grupos contiguos → mismo orden que df
+    df['precip_30day_sum'] = por_parcela['precipitation_sum'].rolling(30, min_periods=30).sum().to_numpy()
+    df['precip_90day_sum'] = por_parcela['precipitation_sum'].rolling(90, min_periods=90).sum().to_numpy()
+    avg_temp_daily = (df['temperature_2m_max'] + df['temperature_2m_min']) / 2
+    df['temp_30day_avg'] = (
+        avg_temp_daily.groupby(df['field'], sort=False)
+        .rolling(30, min_periods=30).mean()
+        .to_numpy()
+    )
+
+    add_spi(df, column='precipitation_sum', group='field', scales=(30,))
+    spi = df['SPI_30'].to_numpy()
+    df['drought_binary_SPI'] = (spi < -1).astype(int)
+    df['drought_severity'] = np.select(
+        [np.isnan(spi), spi >= -1.0, spi >= -1.5],
+        [0, 1, 2],
+        default=3
+    )
+    return df
+
+
+def _shards(df, workers):
+    """Trozos contiguos de parcelas completas, de tamaño parecido"""
+    campos = df['field'].to_numpy()
+    inicios = np.flatnonzero(np.r_[True, campos[1:] != campos[:-1]])
+    posiciones = np.searchsorted(inicios, np.linspace(0, len(df), workers + 1)[1:-1])
+    # Más workers que parcelas o última parcela grande: el corte caería fuera
+    cortes = np.unique(inicios[posiciones[posiciones < len(inicios)]])
+    limites = [0, *cortes.tolist(), len(df)]
+    return [df.iloc[a:b] for a, b in zip(limites[:-1], limites[1:]) if b > a]
+
+
+def climate_features_parallel(df, workers=None):
+    """
+    climate_features repartido por parcelas entre workers procesos. Solo
+    compensa con históricos muy grandes; por debajo de
+    DROUGHT_PARALLEL_MIN_ROWS (o sin fork disponible) se calcula aquí mismo.
+    """
+    workers = DROUGHT_WORKERS if workers is None else workers
+    if (workers <= 1 or len(df) < DROUGHT_PARALLEL_MIN_ROWS
+            or 'fork' not in multiprocessing.get_all_start_methods()):
+        return climate_features(df)
+    # fork: los hijos no vuelven a importar el script del job (que arranca su scheduler)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        partes = list(pool.map(climate_features, _shards(df, workers)))
+    return pd.concat(partes, ignore_index=True)
+
+
+def drought_scores(df):
+    """
+    Severidad final (máximo de clima y suelo escalado), riesgo High/Low y
+    confianza: 40 por SPI, 40 por suelo, +10 Moderate / +20 Severe, tope 100.
+    """
+    suelo = df['drought_soil_based'].to_numpy(dtype=float)
+    valido = np.isin(suelo, (0, 1, 2))
+    df['soil_severity_scaled'] = np.where(
+        valido, _SOIL_SEVERITY_SCALED[np.where(valido, suelo, 0).astype(int)], 0
+    ).astype(float)
+
+    # fmax ignora NaN, como max(axis=1)
+    severidad = np.fmax(df['drought_severity'].to_numpy(dtype=float), df['soil_severity_scaled'].to_numpy())
+    df['severity_numeric'] = severidad
+    codigos = np.select([severidad <= 1, severidad == 2], [0, 1], default=2)
+    df['severity'] = pd.Categorical.from_codes(codigos, dtype=SEVERITY_LEVELS)
+
+    spi = (df['drought_binary_SPI'].to_numpy(dtype=float) == 1)
+    soil = (df['drought_binary_soil'].to_numpy(dtype=float) == 1)
+    df['drought_risk'] = np.where(spi | soil, 'High', 'Low')
+    df['drought_confidence'] = np.minimum(
+        40 * spi.astype(np.int64) + 40 * soil.astype(np.int64) + _CONFIDENCE_BY_SEVERITY[codigos], 100
+    )
+    return df
@@ -0,0 +1,233 @@
+"""
+Límite adaptativo de peticiones simultáneas por proveedor externo (AIMD).
+
+Cada proveedor (Open-Meteo, Sentinel Hub, GEE, Auravant) tiene un límite
+compartido por todo el proceso. Con respuestas sanas el límite sube +1 por
+"ronda" (+1/límite por respuesta); ante un 429, un 5xx, un timeout o una
+latencia por encima de LIMITER_LATENCY_FACTOR veces la habitual se reduce a
+la mitad (como mucho una vez por ventana, para que una ráfaga de fallos no lo
+hunda hasta el mínimo).
+
+La latencia solo sirve de señal si las peticiones de un limitador son
+parecidas: Open-Meteo usa un limitador por host y clase de petición
+(app.core.upstream.limiter_for) y los proveedores con llamadas de coste muy
+distinto (LIMITER_OPTIONS) solo recortan por 429 / 5xx / timeout.
+
+    with limiter.get_limiter('sentinelhub').slot() as slot:
+        r = requests.get(url)
+        slot.check(r)               # 429 / 5xx cuentan como sobrecarga
+
+    async with limiter.get_limiter('api.open-meteo.com:batch').aslot() as slot:
+        ...
+
+Las excepciones de timeout o con un status 429 / 5xx dentro del bloque
+también cuentan como sobrecarga. Si no hay hueco en LIMITER_ACQUIRE_TIMEOUT
+segundos se lanza LimiterTimeout (la API responde 503).
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# Límite inicial, mínimo y máximo de peticiones simultáneas por proveedor
+LIMITER_INITIAL = float(os.getenv('LIMITER_INITIAL', '4'))
+LIMITER_MIN = float(os.getenv('LIMITER_MIN', '1'))
+LIMITER_MAX = float(os.getenv('LIMITER_MAX', '32'))
+# Una latencia mayor que FACTOR x la media habitual se trata como sobrecarga
+LIMITER_LATENCY_FACTOR = float(os.getenv('LIMITER_LATENCY_FACTOR', '3'))
+# Segundos mínimos entre dos recortes del límite
+LIMITER_BACKOFF_WINDOW = float(os.getenv('LIMITER_BACKOFF_WINDOW', '1'))
+# Segundos máximos esperando hueco antes de rendirse con LimiterTimeout
+LIMITER_ACQUIRE_TIMEOUT = float(os.getenv('LIMITER_ACQUIRE_TIMEOUT', '30'))
+
+# Proveedores con llamadas heterogéneas (login, listados, análisis de imagen...):
+# una llamada lenta no indica sobrecarga, así que no se recorta por latencia
+LIMITER_OPTIONS = {
+    'auravant': {'latency_backoff': False},
+    'earthengine': {'latency_backoff': False},
+    'sentinelhub': {'latency_backoff': False},
+}
+
+# Respuestas necesarias antes de usar la latencia media como referencia
+_MUESTRAS_MINIMAS = 10
+_ALPHA = 0.1
+
+
+class LimiterTimeout(TimeoutError):
+    """Sin hueco en el limitador del proveedor dentro del tiempo de espera"""
+
+    def __init__(self, name, timeout):
+        super().__init__(f"Sin hueco en el limitador '{name}' tras {timeout:g}s")
+        self.name = name
+
+
+def _status(obj):
+    status = getattr(obj, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(obj, 'response', None), 'status_code', None)
+    return status
+
+
+def is_overload(obj):
+    """True si la respuesta / excepción indica que el proveedor está saturado"""
+    if isinstance(obj, (TimeoutError, asyncio.TimeoutError)) or 'Timeout' in type(obj).__name__:
+        return True
+    status = _status(obj)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class _Slot:
+
+    def __init__(self):
+        self.overloaded = False
+
+    def check(self, respuesta):
+        """Marca la petición como sobrecarga si la respuesta es 429 / 5xx"""
+        if is_overload(respuesta):
+            self.overloaded = True
+        return respuesta
+
+
+class AdaptiveLimiter:
+
+    def __init__(self, name, initial=None, min_limit=None, max_limit=None, latency_backoff=True):
+        self.name = name
+        self.latency_backoff = latency_backoff
+        self.min_limit = LIMITER_MIN if min_limit is None else min_limit
+        self.max_limit = LIMITER_MAX if max_limit is None else max_limit
+        self.limit = min(max(LIMITER_INITIAL if initial is None else initial, self.min_limit), self.max_limit)
+        self.in_flight = 0
+        self.latency = None
+        self.muestras = 0
+        self.requests = 0
+        self.backoffs = 0
+        self.rejected = 0
+        self._ultimo_recorte = 0.0
+        self._cond = threading.Condition()
+
+    def _libre(self):
+        return self.in_flight < int(self.limit)
+
+    def acquire(self, timeout=None):
+        """Espera a tener hueco (bloqueante); False si vence timeout"""
+        with self._cond:
+            if not self._cond.wait_for(self._libre, timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def try_acquire(self):
+        with self._cond:
+            if not self._libre():
+                return False
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout=None):
+        """Como acquire, sin bloquear el event loop (compartido con hilos y otros loops)"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        espera = 0.005
+        while not self.try_acquire():
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 0.1)
+        return True
+
+    def release(self, latencia, overloaded=False):
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            lenta = (
+                self.latency_backoff
+                and self.muestras >= _MUESTRAS_MINIMAS
+                and latencia > LIMITER_LATENCY_FACTOR * self.latency
+            )
+            if overloaded or lenta:
+                ahora = time.monotonic()
+                if ahora - self._ultimo_recorte >= LIMITER_BACKOFF_WINDOW:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._ultimo_recorte = ahora
+                    self.backoffs += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if not overloaded:
+                # Media móvil de la latencia; los picos entran amortiguados
+                self.latency = latencia if self.latency is None else (1 - _ALPHA) * self.latency + _ALPHA * latencia
+                self.muestras += 1
+            self._cond.notify_all()
+
+    def _cerrar(self, inicio, slot, error):
+        if error is not None and is_overload(error):
+            slot.overloaded = True
+        self.release(time.perf_counter() - inicio, slot.overloaded)
+
+    def _timeout(self, timeout):
+        return LIMITER_ACQUIRE_TIMEOUT if timeout is None else timeout
+
+    def _rechazar(self, timeout):
+        with self._cond:
+            self.rejected += 1
+        return LimiterTimeout(self.name, timeout)
+
+    @contextmanager
+    def slot(self, timeout=None):
+        timeout = self._timeout(timeout)
+        if not self.acquire(timeout):
+            raise self._rechazar(timeout)
+        inicio, slot, error = time.perf_counter(), _Slot(), None
+        try:
+            yield slot
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._cerrar(inicio, slot, error)
+
+    @asynccontextmanager
+    async def aslot(self, timeout=None):
+        timeout = self._timeout(timeout)
+        if not await self.acquire_async(timeout):
+            raise self._rechazar(timeout)
+        inicio, slot, error = time.perf_counter(), _Slot(), None
+        try:
+            yield slot
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._cerrar(inicio, slot, error)
+
+    def snapshot(self):
+        return {
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'min': self.min_limit,
+            'max': self.max_limit,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'requests': self.requests,
+            'latency_backoff': self.latency_backoff,
+            'backoffs': self.backoffs,
+            'rejected': self.rejected,
+        }
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiter(name, **kwargs):
+    """Limitador compartido del proveedor name (kwargs y LIMITER_OPTIONS solo cuentan al crearlo)"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = _limiters[name] = AdaptiveLimiter(name, **{**LIMITER_OPTIONS.get(name, {}), **kwargs})
+    return limiter
+
+
+def limits():
+    """Estado actual de todos los limitadores (para /debug/limits)"""
+    return {name: limiter.snapshot() for name, limiter in sorted(_limiters.items())}
@@ -0,0 +1,263 @@
+"""
+Registro de métricas en memoria del proceso (API y cada ProgramedJob tienen el suyo).
+
+Consultas SQL: por nombre de query se acumulan llamadas, errores, histograma
+de latencia, filas devueltas/afectadas y muestras de las consultas lentas con
+los parámetros redactados y la SQL cortada en VALUES (execute_values ya trae
+las filas incrustadas en el texto). El nombre sale de un comentario '-- name: xxx' en
+la propia SQL o, si no lo hay, del verbo + tabla ('select weather_archive').
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Consultas más lentas que esto (ms) se guardan como muestra
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+# Muestras lentas que se conservan por query
+METRICS_SLOW_SAMPLES = int(os.getenv('METRICS_SLOW_SAMPLES', '10'))
+
+# Límites superiores (ms) de los cubos del histograma; el último es +inf
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+_NAME_RE = re.compile(r'--\s*name:\s*([\w.\-]+)', re.IGNORECASE)
+_VERB_RE = re.compile(r'^\s*(?:--[^\n]*\n\s*)*(\w+)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES\b', re.IGNORECASE)
+_TABLE_RE = re.compile(r'\b(?:from|into|update|copy|join|table|truncate)\s+(?:if\s+(?:not\s+)?exists\s+)?([\w."]+)', re.IGNORECASE)
+
+
+def query_name(sql):
+    """Nombre estable para agrupar una SQL en las métricas"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = str(sql)
+    nombre = _NAME_RE.search(sql)
+    if nombre:
+        return nombre.group(1)
+    verbo = _VERB_RE.match(sql)
+    tabla = _TABLE_RE.search(sql)
+    partes = [verbo.group(1).lower() if verbo else 'sql']
+    if tabla:
+        partes.append(tabla.group(1).replace('"', '').split('.')[-1].lower())
+    return ' '.join(partes)
+
+
+def redact(params):
+    """Parámetros sin valores: solo tipo (y tamaño en colecciones)"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: redact(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        if len(params) > 10:
+            return f"<{type(params).__name__}[{len(params)}]>"
+        return [redact(v) for v in params]
+    return f"<{type(params).__name__}>"
+
+
+def sql_sample(sql, limite=500):
+    """Texto de la SQL para las muestras lentas, sin los datos incrustados tras VALUES"""
+    texto = sql.decode('utf-8', 'replace') if isinstance(sql, bytes) else str(sql)
+    corte = _VALUES_RE.search(texto)
+    if corte:
+        texto = texto[:corte.end()] + ' …'
+    return ' '.join(texto.split())[:limite]
+
+
+class QueryStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.slow = deque(maxlen=METRICS_SLOW_SAMPLES)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 2),
+            'avg_ms': round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 2),
+            'histogram_ms': {
+                ('+inf' if limite == float('inf') else str(limite)): n
+                for limite, n in zip(LATENCY_BUCKETS_MS, self.buckets)
+            },
+            'slow_samples': list(self.slow),
+        }
+
+
+class MetricsRegistry:
+    """Métricas del proceso; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._counters = {}
+
+    def observe_query(self, sql, params, elapsed_ms, rows=None, error=False):
+        nombre = query_name(sql)
+        with self._lock:
+            stats = self._queries.get(nombre)
+            if stats is None:
+                stats = self._queries[nombre] = QueryStats()
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            if error:
+                stats.errors += 1
+            if rows is not None and rows > 0:
+                stats.rows += rows
+            for i, limite in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= limite:
+                    stats.buckets[i] += 1
+                    break
+            if elapsed_ms >= DB_SLOW_QUERY_MS:
+                stats.slow.append({
+                    'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'ms': round(elapsed_ms, 2),
+                    'rows': rows,
+                    'sql': sql_sample(sql),
+                    'params': redact(params),
+                })
+
+    def add_rows(self, sql, rows):
+        """Suma filas leídas después del execute (cursores con nombre) sin contar otra llamada"""
+        if not rows:
+            return
+        nombre = query_name(sql)
+        with self._lock:
+            stats = self._queries.get(nombre)
+            if stats is None:
+                stats = self._queries[nombre] = QueryStats()
+            stats.rows += rows
+
+    def incr(self, nombre, n=1):
+        with self._lock:
+            self._counters[nombre] = self._counters.get(nombre, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'queries': {k: v.to_dict() for k, v in sorted(self._queries.items())},
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._counters.clear()
+
+    def log_summary(self, top=10):
+        """Log de las queries con más tiempo acumulado"""
+        with self._lock:
+            ranking = sorted(self._queries.items(), key=lambda kv: kv[1].total_ms, reverse=True)[:top]
+            lineas = [
+                f"   {nombre}: {s.calls} llamadas, {s.total_ms / 1000:.1f}s total, "
+                f"máx {s.max_ms:.0f}ms, {s.rows} filas"
+                for nombre, s in ranking
+            ]
+        if lineas:
+            logger.info("⏱️ Queries con más tiempo acumulado:\n" + "\n".join(lineas))
+
+
+metrics = MetricsRegistry()
+
+
+class InstrumentedCursorMixin:
+    """
+    Mide execute / executemany / copy_expert de cualquier cursor psycopg2.
+
+    En un cursor con nombre (del lado del servidor) execute no trae filas:
+    las que llegan con fetchone / fetchmany / fetchall o iterando se suman a
+    la query que las produjo.
+    """
+
+    _metrics_sql = None
+
+    def _observe(self, sql, params, inicio, error):
+        elapsed_ms = (time.perf_counter() - inicio) * 1000
+        rows = None if error else self.rowcount
+        if hasattr(sql, 'as_string'):
+            sql = sql.as_string(self)
+        self._metrics_sql = sql
+        metrics.observe_query(sql, params, elapsed_ms, rows, error)
+
+    def _leidas(self, n):
+        if self.name is not None and self._metrics_sql is not None:
+            metrics.add_rows(self._metrics_sql, n)
+
+    def fetchone(self):
+        fila = super().fetchone()
+        if fila is not None:
+            self._leidas(1)
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = super().fetchmany(*args, **kwargs)
+        self._leidas(len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = super().fetchall()
+        self._leidas(len(filas))
+        return filas
+
+    def __iter__(self):
+        # Se cuenta por tandas de itersize para no tocar el lock en cada fila
+        # El __iter__ del cursor base devuelve el propio cursor (se avanza con su
+        # __next__); el de RealDictCursor y compañía, un generador
+        filas = super().__iter__()
+        siguiente = super().__next__ if filas is self else filas.__next__
+        pendientes = 0
+        try:
+            while True:
+                try:
+                    fila = siguiente()
+                except StopIteration:
+                    return
+                pendientes += 1
+                if pendientes >= self.itersize:
+                    self._leidas(pendientes)
+                    pendientes = 0
+                yield fila
+        finally:
+            self._leidas(pendientes)
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = super().execute(query, vars)
+            error = False
+            return resultado
+        finally:
+            self._observe(query, vars, inicio, error)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = super().executemany(query, vars_list)
+            error = False
+            return resultado
+        finally:
+            self._observe(query, None, inicio, error)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = super().copy_expert(sql, file, *args, **kwargs)
+            error = False
+            return resultado
+        finally:
+            self._observe(sql, None, inicio, error)
+
@@ -0,0 +1,319 @@
+"""
+Esquema de la base de datos, versionado.
+
+Cada migración se aplica una sola vez, en orden y en su propia transacción;
+las aplicadas quedan registradas en schema_migrations. Un advisory lock evita
+que dos procesos (API y jobs arrancando a la vez) migren en paralelo.
+
+    python -m app.core.migrations            # aplica las pendientes
+    python -m app.core.migrations status     # lista aplicadas / pendientes
+    python -m app.core.migrations prune      # borra particiones fuera de retención
+"""
+import logging
+import sys
+
+import pandas as pd
+
+from app.core.database import db_connection
+from app.core.partitions import PARTITIONED_TABLES, create_partitions, mark_created, prune_partitions
+from app.models.parcel_registry import PARCELS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock de migraciones (cualquier entero fijo)
+MIGRATIONS_LOCK_KEY = 72_410_001
+
+# Meses futuros con partición creada de antemano en cada migrate()
+PARTITION_PREMAKE_MONTHS = 2
+
+_SCHEMA_MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     integer PRIMARY KEY,
+    name        text NOT NULL,
+    applied_at  timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+
+def _tipo_tabla(cur, table):
+    """'r' tabla normal, 'p' particionada, None si no existe"""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _particionar(cur, table, create_sql, columnas, dedupe_key=None):
+    """
+    Crea table particionada por mes. Si ya existe como tabla normal se
+    renombra, se copian sus filas a la nueva (deduplicadas por dedupe_key,
+    quedándose con la última escrita) y se elimina la antigua.
+    """
+    tipo = _tipo_tabla(cur, table)
+    if tipo == 'p':
+        return
+
+    legacy = f"{table}_legacy"
+    if tipo == 'r':
+        cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        # El nombre de la PK/índices de la antigua quedaría ocupado
+        cur.execute("""
+            SELECT i.relname FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = %s::regclass
+        """, (legacy,))
+        for (indice,) in cur.fetchall():
+            cur.execute(f"ALTER INDEX {indice} RENAME TO {indice}_legacy")
+
+    cur.execute(create_sql)
+
+    if tipo == 'r':
+        columna = PARTITIONED_TABLES[table]
+        # Filas sin fecha (o sin clave) no caben en ninguna partición: se cuentan antes de descartarlas
+        validas = ' AND '.join(f'{c} IS NOT NULL' for c in (dedupe_key or [columna]))
+        cur.execute(f"SELECT count(*), count(*) FILTER (WHERE NOT ({validas})) FROM {legacy}")
+        total, nulas = cur.fetchone()
+        if nulas:
+            logger.warning(f"⚠️ {table}: {nulas:,} filas antiguas sin {' / '.join(dedupe_key or [columna])} se descartan")
+        cur.execute(f"SELECT min({columna}), max({columna}) FROM {legacy}")
+        desde, hasta = cur.fetchone()
+        if desde is not None:
+            create_partitions(cur, table, desde, hasta)
+            lista = ', '.join(columnas)
+            if dedupe_key:
+                clave = ', '.join(dedupe_key)
+                cur.execute(f"""
+                    INSERT INTO {table} ({lista})
+                    SELECT DISTINCT ON ({clave}) {lista}
+                    FROM {legacy}
+                    WHERE {validas}
+                    ORDER BY {clave}, ctid DESC
+                """)
+            else:
+                cur.execute(f"INSERT INTO {table} ({lista}) SELECT {lista} FROM {legacy} WHERE {validas}")
+            migradas = cur.rowcount
+            logger.info(f"📦 {table}: {migradas:,} filas migradas a la tabla particionada")
+            if total - nulas - migradas:
+                logger.warning(f"⚠️ {table}: {total - nulas - migradas:,} filas duplicadas descartadas (se conserva la última)")
+        cur.execute(f"DROP TABLE {legacy}")
+
+
+def m001_base_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS parcels (
+            uid_parcel          text PRIMARY KEY,
+            coordinates_parcel  text NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS parcel_vegetation_indices (
+            uid_parcel  text NOT NULL,
+            fecha       date NOT NULL,
+            ndvi        double precision,
+            gndvi       double precision,
+            ndwi        double precision,
+            savi        double precision
+        );
+
+        CREATE TABLE IF NOT EXISTS alertas (
+            uid_parcel          text NOT NULL,
+            fecha               date NOT NULL,
+            alerta_helada       text,
+            alerta_inundacion   text,
+            alerta_plaga        text,
+            alerta_sequia       text,
+            CONSTRAINT pk_alertas PRIMARY KEY (uid_parcel, fecha)
+        );
+    """)
+
+
+def m002_weather_archive_partitioned(cur):
+    _particionar(cur, 'weather_archive', """
+        CREATE TABLE weather_archive (
+            uid_parcel      text NOT NULL,
+            time            date NOT NULL,
+            temp_max        double precision,
+            temp_min        double precision,
+            rain            double precision,
+            humidity_mean   double precision,
+            humidity_min    double precision,
+            humidity_max    double precision,
+            CONSTRAINT pk_weather_archive PRIMARY KEY (uid_parcel, time)
+        ) PARTITION BY RANGE (time)
+    """,
+        # Columnas congeladas: la migración no cambia si el modelo cambia después
+        ['uid_parcel', 'time', 'temp_max', 'temp_min', 'rain', 'humidity_mean', 'humidity_min', 'humidity_max'],
+        dedupe_key=['uid_parcel', 'time'])
+
+
+def m003_meteo_forecast_partitioned(cur):
+    _particionar(cur, 'meteo_forecast', """
+        CREATE TABLE meteo_forecast (
+            uid_parcel          text NOT NULL,
+            time                timestamp NOT NULL,
+            temperature         double precision,
+            relative_humidity   double precision,
+            precipitation       double precision,
+            cloud_cover         double precision,
+            wind_speed          double precision,
+            wind_direction      double precision
+        ) PARTITION BY RANGE (time)
+    """,
+        ['uid_parcel', 'time', 'temperature', 'relative_humidity', 'precipitation',
+         'cloud_cover', 'wind_speed', 'wind_direction'])
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_meteo_forecast_parcel_time ON meteo_forecast (uid_parcel, time)")
+
+
+def m004_vegetation_unique_key(cur):
+    # Una fila por parcela y día; antes se eliminan duplicados quedándose con la última escrita
+    cur.execute("""
+        DELETE FROM parcel_vegetation_indices a
+        USING parcel_vegetation_indices b
+        WHERE a.uid_parcel = b.uid_parcel
+          AND a.fecha = b.fecha
+          AND a.ctid < b.ctid;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_parcel_vegetation_indices_parcel_fecha
+            ON parcel_vegetation_indices (uid_parcel, fecha);
+    """)
+
+
+def m005_parcels_notify_trigger(cur):
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION notify_parcels_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{PARCELS_CHANNEL}', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_parcels_changed ON parcels;
+        CREATE TRIGGER trg_parcels_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON parcels
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_parcels_changed();
+    """)
+
+
+def m006_auravant_catalogue(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS auravant_fields (
+            id_campo        text PRIMARY KEY,
+            uuid            text,
+            nombre          text,
+            posicion        integer NOT NULL,
+            data            jsonb NOT NULL,
+            content_hash    text NOT NULL,
+            updated_at      timestamptz NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS auravant_lots (
+            id_lote         text PRIMARY KEY,
+            id_campo        text NOT NULL REFERENCES auravant_fields (id_campo) ON DELETE CASCADE,
+            uuid            text,
+            nombre          text,
+            shape           text,
+            posicion        integer NOT NULL,
+            data            jsonb NOT NULL,
+            content_hash    text NOT NULL,
+            updated_at      timestamptz NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS ix_auravant_lots_campo ON auravant_lots (id_campo, posicion);
+        CREATE INDEX IF NOT EXISTS ix_auravant_lots_uuid ON auravant_lots (uuid);
+
+        -- Una sola fila: ETag del catálogo y claves sueltas de la respuesta de getfields
+        CREATE TABLE IF NOT EXISTS auravant_sync (
+            id          boolean PRIMARY KEY DEFAULT true CHECK (id),
+            etag        text NOT NULL,
+            extra       jsonb NOT NULL DEFAULT '{}',
+            synced_at   timestamptz NOT NULL,
+            changed_at  timestamptz NOT NULL
+        );
+    """)
+
+
+MIGRATIONS = [
+    (1, 'base_tables', m001_base_tables),
+    (2, 'weather_archive_partitioned', m002_weather_archive_partitioned),
+    (3, 'meteo_forecast_partitioned', m003_meteo_forecast_partitioned),
+    (4, 'vegetation_unique_key', m004_vegetation_unique_key),
+    (5, 'parcels_notify_trigger', m005_parcels_notify_trigger),
+    (6, 'auravant_catalogue', m006_auravant_catalogue),
+]
+
+
+def _aplicadas(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {version for (version,) in cur.fetchall()}
+
+
+def migrate():
+    """
+    Aplica las migraciones pendientes y crea las particiones del mes actual
+    y los PARTITION_PREMAKE_MONTHS siguientes.
+
+    Returns:
+        lista de versiones aplicadas en esta llamada
+    """
+    aplicadas_ahora = []
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+            try:
+                cur.execute(_SCHEMA_MIGRATIONS_DDL)
+                conn.commit()
+
+                aplicadas = _aplicadas(cur)
+                for version, nombre, aplicar in MIGRATIONS:
+                    if version in aplicadas:
+                        continue
+                    logger.info(f"🛠️ Aplicando migración {version:03d}_{nombre}...")
+                    try:
+                        aplicar(cur)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (version, nombre)
+                        )
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        logger.error(f"❌ Migración {version:03d}_{nombre} fallida")
+                        raise
+                    aplicadas_ahora.append(version)
+
+                hoy = pd.Timestamp.today()
+                creadas = []
+                for table in PARTITIONED_TABLES:
+                    creadas += create_partitions(cur, table, hoy, hoy + pd.DateOffset(months=PARTITION_PREMAKE_MONTHS))
+                conn.commit()
+                mark_created(creadas)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+                conn.commit()
+
+    logger.info(f"✅ Esquema al día ({len(aplicadas_ahora)} migraciones aplicadas)")
+    return aplicadas_ahora
+
+
+def status():
+    """Versiones aplicadas y pendientes"""
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_SCHEMA_MIGRATIONS_DDL)
+            conn.commit()
+            aplicadas = _aplicadas(cur)
+    return {
+        'applied': [f"{v:03d}_{n}" for v, n, _ in MIGRATIONS if v in aplicadas],
+        'pending': [f"{v:03d}_{n}" for v, n, _ in MIGRATIONS if v not in aplicadas],
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    if comando == 'upgrade':
+        migrate()
+    elif comando == 'status':
+        for estado, versiones in status().items():
+            print(f"{estado}: {', '.join(versiones) or '-'}")
+    elif comando == 'prune':
+        prune_partitions()
+    else:
+        sys.exit(f"Comando desconocido: {comando} (upgrade | status | prune)")
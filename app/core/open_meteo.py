@@ -0,0 +1,499 @@
+"""
+Cliente de Open-Meteo por lotes.
+
+Open-Meteo acepta listas de coordenadas separadas por comas y devuelve un
+array con un resultado por ubicación, en el mismo orden. Aquí se empaquetan
+hasta OPEN_METEO_BATCH_SIZE parcelas por petición y la respuesta se reparte
+de vuelta por uid_parcel: 1.000 parcelas son ~10 llamadas en vez de 1.000.
+
+Las parcelas que caen en la misma celda del modelo se consultan una sola vez
+y el resultado se reparte a todas ellas. La celda es la que devuelve el propio
+Open-Meteo en cada respuesta (latitude / longitude del punto de rejilla y
+elevation usada para la corrección por altitud): la primera vez cada punto se
+consulta por separado (solo se agrupan coordenadas idénticas) y desde entonces
+el proceso recuerda su celda, así que los valores no cambian respecto a
+consultar parcela a parcela. Opcionalmente (OPEN_METEO_GRID_STEP > 0) se
+agrupa además por una rejilla fija, que sí mueve el punto consultado.
+
+Los lotes se piden en paralelo (asyncio, como mucho OPEN_METEO_CONCURRENCY a
+la vez): un refresco completo tarda lo que la petición más lenta, no la suma.
+Por debajo de ese tope manda el limitador adaptativo del host, que baja la
+concurrencia si Open-Meteo responde 429 / 5xx o se vuelve lento.
+
+El histórico (archive) de días con más de OPEN_METEO_ARCHIVE_MUTABLE_DAYS de
+antigüedad ya no cambia: esas respuestas se guardan en disco por celda y mes
+natural (la clave no depende del rango pedido ni del día en que se ejecuta),
+y las re-ejecuciones y backfills las leen de ahí.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import threading
+from datetime import date, timedelta
+
+import httpx
+import pandas as pd
+
+from app.core import upstream
+from app.core.limiter import is_overload
+from app.core.metrics import metrics
+from app.core.response_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# Ubicaciones por petición (la URL crece con cada par lat/lon)
+OPEN_METEO_BATCH_SIZE = int(os.getenv('OPEN_METEO_BATCH_SIZE', '100'))
+# Paso de una rejilla fija (grados) a la que se ajustan las coordenadas; 0 = solo la celda
+# del modelo que devuelve Open-Meteo (por defecto: ajustar cambia el punto consultado y los valores)
+OPEN_METEO_GRID_STEP = float(os.getenv('OPEN_METEO_GRID_STEP', '0'))
+# Peticiones simultáneas y timeout total (s) de cada una, reintentos incluidos
+OPEN_METEO_CONCURRENCY = int(os.getenv('OPEN_METEO_CONCURRENCY', '8'))
+OPEN_METEO_REQUEST_TIMEOUT = float(os.getenv('OPEN_METEO_REQUEST_TIMEOUT', '60'))
+# Reintentos de un lote entero ante 429 / 5xx / timeout y espera base (s, se duplica en cada uno)
+OPEN_METEO_RETRIES = int(os.getenv('OPEN_METEO_RETRIES', '2'))
+OPEN_METEO_RETRY_BACKOFF = float(os.getenv('OPEN_METEO_RETRY_BACKOFF', '2'))
+# Caché en disco del histórico: directorio, tamaño máximo (0 = desactivada) y
+# días recientes que Open-Meteo aún puede revisar (nunca se cachean)
+OPEN_METEO_CACHE_DIR = os.getenv('OPEN_METEO_CACHE_DIR', os.path.join('cache', 'open_meteo'))
+OPEN_METEO_CACHE_MAX_MB = float(os.getenv('OPEN_METEO_CACHE_MAX_MB', '500'))
+OPEN_METEO_ARCHIVE_MUTABLE_DAYS = int(os.getenv('OPEN_METEO_ARCHIVE_MUTABLE_DAYS', '5'))
+
+archive_cache = (
+    DiskCache(OPEN_METEO_CACHE_DIR, OPEN_METEO_CACHE_MAX_MB * 1e6, name='open_meteo.archive_cache')
+    if OPEN_METEO_CACHE_MAX_MB > 0 else None
+)
+
+CURRENT_VARIABLES = "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m,wind_direction_10m"
+DAILY_FORECAST_VARIABLES = (
+    "temperature_2m_max,temperature_2m_min,"
+    "precipitation_sum,relative_humidity_2m_max,"
+    "relative_humidity_2m_min"
+)
+ARCHIVE_DAILY_VARIABLES = "temperature_2m_max,temperature_2m_min,precipitation_sum"
+ARCHIVE_HOURLY_VARIABLES = "relative_humidity_2m"
+
+
+def _snap(valor, step):
+    return round(round(valor / step) * step, 6)
+
+
+# (url, (lat, lon) consultado) -> (lat, lon, elevation) de la celda del modelo que respondió
+_celdas_modelo = {}
+_celdas_lock = threading.Lock()
+
+
+def _punto(lat, lon):
+    return round(float(lat), 6), round(float(lon), 6)
+
+
+def _aprender_celdas(url, celdas, respuestas):
+    """Guarda la celda del modelo de cada punto consultado (campos latitude/longitude/elevation)"""
+    with _celdas_lock:
+        for celda in celdas:
+            data = respuestas.get(celda["uid_parcel"])
+            if isinstance(data, dict) and "latitude" in data and "longitude" in data:
+                _celdas_modelo[(url, _punto(celda["lat"], celda["lon"]))] = (
+                    data["latitude"], data["longitude"], data.get("elevation")
+                )
+
+
+def grid_cells(parcelas, step=None, url=None):
+    """
+    Agrupa parcelas que darían la misma respuesta de Open-Meteo.
+
+    Con step 0 (por defecto) se agrupan las de coordenadas idénticas y, si ya
+    se consultó url desde su punto, las de la misma celda del modelo; se
+    consulta el punto de la primera parcela de cada grupo. Con step > 0 se
+    agrupa por la rejilla fija de ese paso (el punto consultado cambia).
+
+    Returns:
+        (celdas, mapping): celdas es una lista de pseudo-parcelas
+        {uid_parcel: id de celda, lat, lon} con el punto a consultar;
+        mapping es id de celda -> [uid_parcel, ...] de las parcelas que cubre.
+    """
+    step = OPEN_METEO_GRID_STEP if step is None else step
+    celdas = {}
+    mapping = {}
+    for parcela in parcelas:
+        if step > 0:
+            lat, lon = _snap(parcela["lat"], step), _snap(parcela["lon"], step)
+            cell_id = f"cell:{lat},{lon}"
+        else:
+            lat, lon = parcela["lat"], parcela["lon"]
+            modelo = _celdas_modelo.get((url, _punto(lat, lon))) if url else None
+            cell_id = f"model:{modelo[0]},{modelo[1]},{modelo[2]}" if modelo else "point:%s,%s" % _punto(lat, lon)
+        if cell_id not in celdas:
+            celdas[cell_id] = {"uid_parcel": cell_id, "lat": lat, "lon": lon}
+            mapping[cell_id] = []
+        mapping[cell_id].append(parcela["uid_parcel"])
+    _log_dedupe(mapping)
+    return list(celdas.values()), mapping
+
+
+def dedupe_ratio(mapping):
+    """Fracción de consultas ahorradas: 1 - celdas / parcelas"""
+    parcelas = sum(len(uids) for uids in mapping.values())
+    return 1 - len(mapping) / parcelas if parcelas else 0.0
+
+
+def _log_dedupe(mapping):
+    n_parcelas = sum(len(uids) for uids in mapping.values())
+    if not n_parcelas:
+        return
+    metrics.incr('open_meteo.parcels', n_parcelas)
+    metrics.incr('open_meteo.cells', len(mapping))
+    logger.info(f"📍 {n_parcelas} parcelas → {len(mapping)} celdas "
+                f"({dedupe_ratio(mapping):.0%} de consultas ahorradas)")
+
+
+def fan_out(df, mapping, column='uid_parcel'):
+    """Replica cada fila calculada por celda en una fila por parcela de esa celda (ordenado por parcela)"""
+    mapa = pd.DataFrame(
+        [(cell_id, uid) for cell_id, uids in mapping.items() for uid in uids],
+        columns=['_cell', column]
+    )
+    return (
+        df.rename(columns={column: '_cell'})
+        .merge(mapa, on='_cell')
+        .drop(columns='_cell')[df.columns]
+        .sort_values(column, kind='stable')
+        .reset_index(drop=True)
+    )
+
+
+async def _get_lote(client, url, lote, params):
+    """Una petición para todo el lote → lista de respuestas en el mismo orden"""
+    async with upstream.limiter_for(url, 'batch').aslot() as slot:
+        r = await asyncio.wait_for(client.get(url, params={
+            **params,
+            "latitude": ",".join(str(p["lat"]) for p in lote),
+            "longitude": ",".join(str(p["lon"]) for p in lote),
+        }), timeout=OPEN_METEO_REQUEST_TIMEOUT)
+        slot.check(r)
+    r.raise_for_status()
+    data = r.json()
+    return data if isinstance(data, list) else [data]
+
+
+def _espera_reintento(error, intento):
+    """Segundos antes de reintentar un lote: Retry-After si el 429 lo trae, si no backoff exponencial"""
+    retry_after = getattr(getattr(error, 'response', None), 'headers', {}).get('Retry-After')
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), OPEN_METEO_REQUEST_TIMEOUT)
+    except ValueError:
+        pass
+    return OPEN_METEO_RETRY_BACKOFF * 2 ** intento
+
+
+async def _fetch_lote(client, semaforo, url, lote, params, resultados):
+    for intento in range(OPEN_METEO_RETRIES + 1):
+        try:
+            async with semaforo:
+                respuestas = await _get_lote(client, url, lote, params)
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            # Un 4xx de un lote suele ser una coordenada inválida: se parte en dos para aislarla
+            if 400 <= status < 500 and status != 429:
+                if len(lote) > 1:
+                    mitad = len(lote) // 2
+                    await asyncio.gather(
+                        _fetch_lote(client, semaforo, url, lote[:mitad], params, resultados),
+                        _fetch_lote(client, semaforo, url, lote[mitad:], params, resultados),
+                    )
+                    return
+                logger.error(f"Error en consulta meteo ({lote[0]['uid_parcel']}): HTTPStatusError: {e}")
+                return
+            error = e
+        except Exception as e:
+            error = e
+        else:
+            for parcela, data in zip(lote, respuestas):
+                resultados[parcela["uid_parcel"]] = data
+            return
+
+        # 429 / 5xx / timeout: el lote entero se reintenta con espera (nunca celda a celda,
+        # que multiplicaría las peticiones justo cuando Open-Meteo está saturado)
+        if not (is_overload(error) or isinstance(error, httpx.TransportError)):
+            break
+        if intento < OPEN_METEO_RETRIES:
+            espera = _espera_reintento(error, intento)
+            logger.warning(f"⚠️ Lote de {len(lote)} ubicaciones fallido ({type(error).__name__}: {error}), "
+                           f"reintento {intento + 1}/{OPEN_METEO_RETRIES} en {espera:.0f}s")
+            await asyncio.sleep(espera)
+
+    metrics.incr('open_meteo.failed_locations', len(lote))
+    logger.error(f"❌ Lote de {len(lote)} ubicaciones descartado "
+                 f"(primera: {lote[0]['uid_parcel']}): {type(error).__name__}: {error}")
+
+
+async def _fetch_cells(url, celdas, params, batch_size, concurrency):
+    semaforo = asyncio.Semaphore(concurrency)
+    resultados = {}
+    async with upstream.async_client() as client:
+        await asyncio.gather(*(
+            _fetch_lote(client, semaforo, url, celdas[inicio:inicio + batch_size], params, resultados)
+            for inicio in range(0, len(celdas), batch_size)
+        ))
+    return resultados
+
+
+def _cache_key(url, celda, params):
+    return {
+        "url": url,
+        "lat": round(celda["lat"], 4),
+        "lon": round(celda["lon"], 4),
+        "params": params,
+    }
+
+
+def fetch_cells(url, celdas, params, batch_size=None, concurrency=None):
+    """
+    Consulta url para una lista de ubicaciones (dicts con uid_parcel, lat, lon)
+    en lotes de batch_size, con hasta concurrency lotes en vuelo.
+
+    Returns:
+        dict uid_parcel -> respuesta JSON de esa ubicación. Las ubicaciones
+        que fallan no aparecen (el error queda en el log).
+    """
+    if not celdas:
+        return {}
+    respuestas = asyncio.run(_fetch_cells(
+        url, celdas, params,
+        batch_size or OPEN_METEO_BATCH_SIZE,
+        concurrency or OPEN_METEO_CONCURRENCY
+    ))
+    _aprender_celdas(url, celdas, respuestas)
+    return respuestas
+
+
+def fetch_locations(url, parcelas, params):
+    """Como fetch_cells, pero consultando una vez por celda y repartiendo a cada parcela"""
+    celdas, mapping = grid_cells(parcelas, url=url)
+    por_celda = fetch_cells(url, celdas, params)
+    return {
+        uid: por_celda[cell_id]
+        for cell_id, uids in mapping.items() if cell_id in por_celda
+        for uid in uids
+    }
+
+
+def fetch_current(parcelas):
+    """Tiempo actual por parcela → lista de registros con las columnas de meteo_forecast"""
+    respuestas = fetch_locations(FORECAST_URL, parcelas, {
+        "current": CURRENT_VARIABLES,
+        "timezone": "auto"
+    })
+    registros = []
+    for uid, data in respuestas.items():
+        cur = data["current"]
+        registros.append({
+            "uid_parcel": uid,
+            "time": pd.to_datetime(cur["time"]),
+            "temperature": cur["temperature_2m"],
+            "relative_humidity": cur["relative_humidity_2m"],
+            "precipitation": cur["precipitation"],
+            "cloud_cover": cur["cloud_cover"],
+            "wind_speed": cur["wind_speed_10m"],
+            "wind_direction": cur["wind_direction_10m"]
+        })
+    return registros
+
+
+# Columnas de los frames que devuelven fetch_daily_forecast / fetch_archive (también vacíos)
+DAILY_FORECAST_COLUMNS = ["uid_parcel", "date", "temp_max", "temp_min", "rain", "humidity_max", "humidity_min"]
+ARCHIVE_COLUMNS = ["time", "temp_max", "temp_min", "rain", "humidity_mean", "humidity_min", "humidity_max", "field"]
+
+
+def _frame_vacio(columnas, fechas, claves):
+    """Frame sin filas con las columnas (y tipos) de un frame con datos"""
+    return pd.DataFrame({
+        c: pd.Series(dtype="datetime64[ns]" if c in fechas else object if c in claves else float)
+        for c in columnas
+    })
+
+
+def _daily_forecast_frame(uid_parcel, data):
+    daily = data["daily"]
+    return pd.DataFrame({
+        "uid_parcel": uid_parcel,
+        "date": pd.to_datetime(daily["time"]),
+        "temp_max": daily["temperature_2m_max"],
+        "temp_min": daily["temperature_2m_min"],
+        "rain": daily["precipitation_sum"],
+        "humidity_max": daily["relative_humidity_2m_max"],
+        "humidity_min": daily["relative_humidity_2m_min"]
+    })
+
+
+def fetch_daily_forecast(parcelas, por_celda=False):
+    """
+    Pronóstico diario (7 días) de todas las parcelas en un único DataFrame.
+
+    Con por_celda=True devuelve (frame, mapping) con una fila por celda de
+    rejilla (uid_parcel = id de celda), para calcular sobre las celdas y
+    repartir después con fan_out(resultado, mapping).
+    """
+    celdas, mapping = grid_cells(parcelas, url=FORECAST_URL)
+    respuestas = fetch_cells(FORECAST_URL, celdas, {
+        "daily": DAILY_FORECAST_VARIABLES,
+        "timezone": "auto"
+    })
+    frames = [_daily_forecast_frame(cell_id, data) for cell_id, data in respuestas.items()]
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        # Sin parcelas o todas fallidas: frame vacío con las columnas esperadas
+        df = _frame_vacio(DAILY_FORECAST_COLUMNS, fechas=("date",), claves=("uid_parcel",))
+    if por_celda:
+        return df, mapping
+    return fan_out(df, mapping)
+
+
+def _archive_frame(uid_parcel, data):
+    # ---- HUMEDAD HORARIA → DIARIA ----
+    df_h = pd.DataFrame(data["hourly"])
+    df_h["time"] = pd.to_datetime(df_h["time"])
+    df_h = (
+        df_h.groupby(df_h["time"].dt.date)["relative_humidity_2m"]
+        .agg(["mean", "min", "max"])
+        .round(1)
+        .reset_index()
+    )
+    df_h.columns = ["time", "humidity_mean", "humidity_min", "humidity_max"]
+    df_h["time"] = pd.to_datetime(df_h["time"])
+    # ---- DAILY ----
+    df_d = pd.DataFrame(data["daily"])
+    df_d.columns = ["time", "temp_max", "temp_min", "rain"]
+    df_d["time"] = pd.to_datetime(df_d["time"])
+    df = pd.merge(df_d, df_h, on="time", how="inner")
+    df["field"] = uid_parcel
+    return df
+
+
+def _fin_de_mes(dia):
+    return (dia.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _archive_tramos(fecha_inicio, fecha_fin):
+    """
+    Parte [fecha_inicio, fecha_fin] en meses naturales completos que ya no
+    pueden cambiar (cacheables; se piden enteros aunque el rango empiece a
+    mitad de mes) y un tramo final con el resto, que siempre va a la red.
+
+    Returns:
+        (meses, vivo): meses es una lista de (inicio, fin) por mes y vivo es
+        (inicio, fin) o None, todo como date
+    """
+    inicio = date.fromisoformat(str(fecha_inicio)[:10])
+    fin = date.fromisoformat(str(fecha_fin)[:10])
+    ultimo_inmutable = date.today() - timedelta(days=OPEN_METEO_ARCHIVE_MUTABLE_DAYS)
+    meses = []
+    mes = inicio.replace(day=1)
+    while mes <= fin and _fin_de_mes(mes) <= ultimo_inmutable:
+        meses.append((mes, _fin_de_mes(mes)))
+        mes = _fin_de_mes(mes) + timedelta(days=1)
+    inicio_vivo = max(inicio, mes)
+    return meses, ((inicio_vivo, fin) if inicio_vivo <= fin else None)
+
+
+def _archive_params(inicio, fin):
+    return {
+        "start_date": inicio.isoformat(),
+        "end_date": fin.isoformat(),
+        "hourly": ARCHIVE_HOURLY_VARIABLES,
+        "daily": ARCHIVE_DAILY_VARIABLES,
+        "timezone": "auto"
+    }
+
+
+def _partir_por_mes(data, meses):
+    """Respuesta de archive de varios meses → {inicio de mes: la misma respuesta con solo ese mes}"""
+    partes = {}
+    for inicio_mes, fin_mes in meses:
+        parte = dict(data)
+        for seccion in ("daily", "hourly"):
+            bloque = data[seccion]
+            # Fechas locales ordenadas ('YYYY-MM-DD' / 'YYYY-MM-DDTHH:MM'): el mes es un rango contiguo
+            desde = bisect.bisect_left(bloque["time"], inicio_mes.isoformat())
+            hasta = bisect.bisect_left(bloque["time"], (fin_mes + timedelta(days=1)).isoformat())
+            parte[seccion] = {k: v[desde:hasta] for k, v in bloque.items()}
+        partes[inicio_mes] = parte
+    return partes
+
+
+def _fetch_archive_meses(celdas, meses):
+    """
+    Histórico por (celda, inicio de mes). Cada mes se busca antes en la caché
+    en disco; los que faltan se piden en una sola consulta por celda (del
+    primer al último mes que le falta) y se guardan mes a mes.
+    """
+    resultados = {}
+    grupos = {}
+    for celda in celdas:
+        faltan = []
+        for mes in meses:
+            data = None
+            if archive_cache is not None:
+                data = archive_cache.get(_cache_key(ARCHIVE_URL, celda, _archive_params(*mes)))
+            if data is None:
+                faltan.append(mes)
+            else:
+                resultados[(celda["uid_parcel"], mes[0])] = data
+        if faltan:
+            grupos.setdefault((faltan[0][0], faltan[-1][1]), []).append(celda)
+    if resultados:
+        logger.info(f"💾 {len(resultados)}/{len(celdas) * len(meses)} meses de histórico servidos desde caché en disco")
+
+    guardar = archive_cache is not None
+    for (inicio, fin), grupo in grupos.items():
+        meses_grupo = [m for m in meses if inicio <= m[0] and m[1] <= fin]
+        respuestas = fetch_cells(ARCHIVE_URL, grupo, _archive_params(inicio, fin))
+        for celda in grupo:
+            data = respuestas.get(celda["uid_parcel"])
+            if data is None:
+                continue
+            try:
+                partes = _partir_por_mes(data, meses_grupo)
+            except (KeyError, TypeError) as e:
+                logger.error(f"Respuesta de histórico inesperada para {celda['uid_parcel']}: {e}")
+                continue
+            for mes in meses_grupo:
+                resultados[(celda["uid_parcel"], mes[0])] = partes[mes[0]]
+                if guardar:
+                    try:
+                        archive_cache.put(_cache_key(ARCHIVE_URL, celda, _archive_params(*mes)), partes[mes[0]])
+                    except OSError as e:
+                        logger.warning(f"⚠️ No se pudo escribir en la caché en disco: {e}")
+                        guardar = False
+    if archive_cache is not None and grupos:
+        archive_cache.evict()
+    return resultados
+
+
+def fetch_archive(parcelas, fecha_inicio, fecha_fin):
+    """Histórico diario (temperaturas, lluvia y humedad agregada) → frame para save_meteo_histo"""
+    celdas, mapping = grid_cells(parcelas, url=ARCHIVE_URL)
+    meses, vivo = _archive_tramos(fecha_inicio, fecha_fin)
+
+    respuestas = [(cell_id, data) for (cell_id, _), data in _fetch_archive_meses(celdas, meses).items()]
+    if vivo is not None:
+        respuestas += list(fetch_cells(ARCHIVE_URL, celdas, _archive_params(*vivo)).items())
+
+    # La agregación horaria → diaria se hace una vez por celda y tramo (cada día es independiente)
+    frames = []
+    for cell_id, data in respuestas:
+        try:
+            frames.append(_archive_frame(cell_id, data))
+        except Exception as e:
+            logger.error(f"Error procesando histórico meteo de {cell_id}: {e}")
+    if not frames:
+        return _frame_vacio(ARCHIVE_COLUMNS, fechas=("time",), claves=("field",))
+    df = pd.concat(frames, ignore_index=True)
+    # Los meses cacheados se piden enteros: se recorta al rango pedido
+    df = df[df["time"].between(pd.Timestamp(str(fecha_inicio)[:10]), pd.Timestamp(str(fecha_fin)[:10]))]
+    return fan_out(df, mapping, column='field')
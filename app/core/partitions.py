@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from app.core.database import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Tablas particionadas por mes: tabla -> columna de partición
+PARTITIONED_TABLES = {
+    'weather_archive': 'time',
+    'meteo_forecast': 'time',
+}
+
+# Meses que se conservan en cada tabla (0 = sin límite); prune_partitions borra los anteriores
+RETENTION_MONTHS = {
+    'weather_archive': int(os.getenv('WEATHER_ARCHIVE_RETENTION_MONTHS', '0')),
+    'meteo_forecast': int(os.getenv('METEO_FORECAST_RETENTION_MONTHS', '0')),
+}
+
+_creadas = set()
+_lock = threading.Lock()
+# Serializa la creación (una sola conexión creando particiones a la vez por proceso)
+_creando = threading.Lock()
+
+
+def partition_name(table, mes):
+    """weather_archive + 2026-10 → weather_archive_p2026_10"""
+    return f"{table}_p{mes.year}_{mes.month:02d}"
+
+
+def _meses(desde, hasta):
+    inicio = pd.Timestamp(desde).to_period('M')
+    fin = pd.Timestamp(hasta).to_period('M')
+    return [p.to_timestamp() for p in pd.period_range(inicio, fin, freq='M')]
+
+
+def create_partitions(cur, table, desde, hasta):
+    """
+    Crea (si faltan) las particiones mensuales de table entre desde y hasta,
+    con el cursor dado. Devuelve sus nombres; solo cuentan como creadas
+    (mark_created) cuando quien llama hace commit.
+    """
+    nombres = []
+    for mes in _meses(desde, hasta):
+        nombre = partition_name(table, mes)
+        siguiente = mes + pd.offsets.MonthBegin(1)
+        cur.execute(
+            f"-- name: partitions.create\n"
+            f"CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{siguiente:%Y-%m-%d}')"
+        )
+        nombres.append(nombre)
+    return nombres
+
+
+def mark_created(nombres):
+    """Recuerda particiones ya commiteadas para no volver a comprobarlas en este proceso"""
+    with _lock:
+        _creadas.update(nombres)
+
+
+def ensure_partitions(table, desde, hasta):
+    """
+    Garantiza que existen las particiones de table para [desde, hasta].
+    Lo llaman los writers antes de insertar; no hay partición por defecto,
+    así que una fila sin partición haría fallar el INSERT.
+    """
+    pendientes = [m for m in _meses(desde, hasta) if partition_name(table, m) not in _creadas]
+    if not pendientes:
+        return
+    with _creando:
+        # Otro hilo pudo crearlas mientras esperábamos
+        pendientes = [m for m in pendientes if partition_name(table, m) not in _creadas]
+        if not pendientes:
+            return
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    nombres = create_partitions(cur, table, pendientes[0], pendientes[-1])
+                conn.commit()
+            except Exception:
+                # Si el CREATE no llegó a commitearse, el siguiente writer lo reintenta
+                conn.rollback()
+                raise
+        mark_created(nombres)
+
+
+def drop_partitions_before(table, fecha):
+    """
+    Elimina las particiones de table que terminan antes del mes de fecha.
+    Es un DROP TABLE por mes: no hay DELETE ni VACUUM posterior.
+
+    Returns:
+        lista de particiones eliminadas
+    """
+    limite = pd.Timestamp(fecha).to_period('M').to_timestamp()
+    eliminadas = []
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = %s::regclass
+                """, (table,))
+                for nombre, limites in cur.fetchall():
+                    # FOR VALUES FROM ('2026-01-01') TO ('2026-02-01')
+                    hasta = pd.Timestamp(limites.split("TO ('")[1].split("'")[0])
+                    if hasta <= limite:
+                        cur.execute(f"-- name: partitions.drop\nDROP TABLE {nombre}")
+                        eliminadas.append(nombre)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    with _lock:
+        _creadas.difference_update(eliminadas)
+
+    if eliminadas:
+        logger.info(f"🗑️ {table}: {len(eliminadas)} particiones eliminadas ({', '.join(sorted(eliminadas))})")
+    return eliminadas
+
+
+def prune_partitions():
+    """Aplica RETENTION_MONTHS a cada tabla particionada"""
+    hoy = pd.Timestamp.today()
+    for table, meses in RETENTION_MONTHS.items():
+        if meses > 0:
+            drop_partitions_before(table, hoy - pd.DateOffset(months=meses))
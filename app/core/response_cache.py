@@ -0,0 +1,99 @@
+"""
+Caché en disco de respuestas JSON inmutables (p. ej. el archivo histórico de Open-Meteo).
+
+Cada entrada es un fichero gzip con el JSON, nombrado por el sha256 de su
+clave. Los aciertos actualizan el mtime, y cuando el directorio supera
+max_bytes se borran primero los ficheros con mtime más antiguo (LRU).
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+
+    def __init__(self, directory, max_bytes, name='cache'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json.gz")
+
+    def get(self, key):
+        """Valor guardado para key, o None si no está (o el fichero está corrupto)"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                valor = json.load(f)
+        except FileNotFoundError:
+            metrics.incr(f'{self.name}.miss')
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Entrada de caché ilegible, se descarta: {path} ({e})")
+            self._remove(path)
+            metrics.incr(f'{self.name}.miss')
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # Sin permiso / borrada entre medias: la entrada sigue siendo válida, solo pierde el LRU
+            pass
+        metrics.incr(f'{self.name}.hit')
+        return valor
+
+    def put(self, key, valor):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: un lector nunca ve un fichero a medias
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(json.dumps(valor, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp, path)
+        except Exception:
+            self._remove(tmp)
+            raise
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta quedar por debajo de max_bytes"""
+        with self._lock:
+            entradas = []
+            total = 0
+            for raiz, _, ficheros in os.walk(self.directory):
+                for nombre in ficheros:
+                    path = os.path.join(raiz, nombre)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entradas.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return 0
+            borradas = 0
+            for _, size, path in sorted(entradas):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                borradas += 1
+            logger.info(f"🧹 {self.name}: {borradas} entradas expulsadas ({total / 1e6:.1f} MB)")
+            return borradas
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
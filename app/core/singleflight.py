@@ -0,0 +1,64 @@
+"""
+Agrupación de llamadas idénticas concurrentes (single-flight).
+
+Si varias peticiones piden lo mismo a la vez, solo la primera llama al
+proveedor; el resto espera y recibe el mismo resultado (o la misma
+excepción). No es una caché: en cuanto la llamada termina, la siguiente
+vuelve a salir.
+
+    sentinel_flight = SingleFlight('sentinel')
+    result = sentinel_flight.do(wkt, lambda: service.analyze_polygon(wkt))
+
+Métricas (contadores del registro de app.core.metrics):
+    <name>.calls      llamadas que salieron al proveedor
+    <name>.coalesced  peticiones que esperaron a una llamada ya en vuelo
+"""
+import threading
+
+from app.core.metrics import metrics
+
+
+class _Llamada:
+
+    def __init__(self):
+        self.hecha = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self, name):
+        self.name = name
+        self._en_vuelo = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Resultado de fn(); si ya hay una llamada en vuelo para key, espera a la suya"""
+        with self._lock:
+            llamada = self._en_vuelo.get(key)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_vuelo[key] = _Llamada()
+
+        if not lider:
+            metrics.incr(f'{self.name}.coalesced')
+            llamada.hecha.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        metrics.incr(f'{self.name}.calls')
+        try:
+            llamada.resultado = fn()
+            return llamada.resultado
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[key]
+            llamada.hecha.set()
+
+    def in_flight(self):
+        return len(self._en_vuelo)
@@ -0,0 +1,95 @@
+"""
+Clientes HTTP compartidos para las APIs externas (Open-Meteo, ...).
+
+Un httpx.Client por host y proceso: las conexiones se reutilizan (keep-alive)
+entre parcelas y entre ciclos, así que DNS + TCP + TLS se paga una vez por
+conexión y no una vez por petición. HTTP/2 se activa si el paquete h2 está
+instalado. Las peticiones pasan por el limitador adaptativo del host y la
+clase de petición (app.core.limiter): una consulta de un punto y un lote de
+cientos de coordenadas tardan muy distinto y no comparten latencia habitual.
+
+    from app.core import upstream
+    r = upstream.get("https://api.open-meteo.com/v1/forecast", params=params)
+    r.raise_for_status()
+"""
+import importlib.util
+import os
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.limiter import get_limiter
+
+# Segundos: conexión y lectura de cada petición
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '5'))
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', '30'))
+# Conexiones simultáneas y conexiones ociosas que se mantienen por host
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', '10'))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv('UPSTREAM_MAX_KEEPALIVE', '10'))
+# Segundos que una conexión ociosa sigue abierta
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv('UPSTREAM_KEEPALIVE_EXPIRY', '60'))
+
+HTTP2 = importlib.util.find_spec('h2') is not None
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _host(url):
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+
+def _client_kwargs():
+    return dict(
+        http2=HTTP2,
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_client(url):
+    """httpx.Client compartido para el host de url (thread-safe)"""
+    host = _host(url)
+    client = _clients.get(host)
+    if client is None:
+        with _lock:
+            client = _clients.get(host)
+            if client is None:
+                client = _clients[host] = httpx.Client(**_client_kwargs())
+    return client
+
+
+def limiter_for(url, clase='single'):
+    """Limitador adaptativo compartido del host de url para la clase de petición ('single', 'batch')"""
+    return get_limiter(f"{urlsplit(url).netloc}:{clase}")
+
+
+def get(url, params=None, clase='single', **kwargs):
+    """GET por el cliente compartido del host, dentro del límite de concurrencia de su clase"""
+    with limiter_for(url, clase).slot() as slot:
+        return slot.check(get_client(url).get(url, params=params, **kwargs))
+
+
+def async_client():
+    """
+    httpx.AsyncClient con los mismos límites y timeouts. Va ligado al event
+    loop que lo usa, así que se crea por ejecución:
+
+        async with upstream.async_client() as client:
+            ...
+    """
+    return httpx.AsyncClient(**_client_kwargs())
+
+
+def close_clients():
+    """Cierra todos los clientes (fin de proceso / tests)"""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
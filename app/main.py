@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from app.api.auth import auth_bp
 from app.api.fields import field_bp
@@ -6,6 +6,8 @@ from app.api.meteo import meteo_bp
 from app.api.maps import sentinel_bp
 from app.api.conversations import conversations_bp
 from app.api.app_llm import messages_bp
+from app.api.debug import debug_bp
+from app.core.limiter import LimiterTimeout
 
 app = Flask(__name__)
 #CORS(app)  # ← ESTO HACE LA MAGIA ✨
@@ -22,6 +24,16 @@ app.register_blueprint(meteo_bp)
 app.register_blueprint(sentinel_bp)
 app.register_blueprint(conversations_bp)
 app.register_blueprint(messages_bp)
+app.register_blueprint(debug_bp)
+
+
+@app.errorhandler(LimiterTimeout)
+def proveedor_saturado(e):
+    # Proveedor externo sin hueco en el limitador: mejor 503 que colgar el worker
+    resp = jsonify({"success": False, "message": str(e)})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '5'
+    return resp
 
 @app.route('/')
 def home():
@@ -90,6 +102,13 @@ def home():
                 "auth_required": False,
                 "body": {"uid_parcel": "string"},
                 "description": "Sentinel-2 NDVI/NDWI/NDRE/GNDVI mapas base64. Solo hay que mandar el parámetro uid_parcel con el Id de la parcela de la base de datos."
+            },
+            # DEBUG
+            {
+                "path": "/agrosync-api/debug/metrics",
+                "method": "GET",
+                "auth_required": True,
+                "description": "Métricas del proceso: latencia/filas por query SQL y muestras lentas (X-Debug-Token; desactivado sin DEBUG_METRICS_TOKEN). POST /debug/metrics/reset las reinicia"
             }
         ]
     }
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from app.core.database import db_connection
+
+# Filas por sentencia INSERT ... VALUES en el upsert de alertas
+ALERTAS_PAGE_SIZE = int(os.getenv('ALERTAS_PAGE_SIZE', '5000'))
+
+KEY_COLUMNS = ['uid_parcel', 'fecha']
+ALERT_COLUMNS = ['alerta_helada', 'alerta_inundacion', 'alerta_plaga', 'alerta_sequia']
+
+_UPSERT_SQL = f"""
+-- name: alertas.upsert
+INSERT INTO alertas AS a ({', '.join(KEY_COLUMNS + ALERT_COLUMNS)})
+VALUES %s
+ON CONFLICT ON CONSTRAINT pk_alertas DO UPDATE
+SET {', '.join(f'{c} = EXCLUDED.{c}' for c in ALERT_COLUMNS)}
+WHERE ({', '.join(f'a.{c}' for c in ALERT_COLUMNS)})
+      IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in ALERT_COLUMNS)})
+RETURNING {', '.join(f'a.{c}' for c in KEY_COLUMNS + ALERT_COLUMNS)}, (xmax = 0) AS inserted
+"""
+
+
+def upsert_alertas(df: pd.DataFrame, page_size: int = ALERTAS_PAGE_SIZE) -> pd.DataFrame:
+    """
+    UPSERT masivo en alertas (PK pk_alertas = uid_parcel, fecha) en una sola transacción.
+
+    Se envían páginas de page_size filas por sentencia; las filas cuyo valor
+    no cambia no se reescriben. Si una clave aparece repetida gana la última,
+    igual que con el UPSERT fila a fila.
+
+    Returns:
+        DataFrame con las filas que realmente cambiaron y la columna
+        inserted (True = alta nueva, False = actualización)
+    """
+    columnas = KEY_COLUMNS + ALERT_COLUMNS
+    if df.empty:
+        return pd.DataFrame(columns=columnas + ['inserted'])
+
+    datos = df[columnas].drop_duplicates(KEY_COLUMNS, keep='last')
+    datos = datos.astype(object).where(datos.notna(), None)
+    values = list(datos.itertuples(index=False, name=None))
+
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cambios = execute_values(cur, _UPSERT_SQL, values, page_size=page_size, fetch=True)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return pd.DataFrame(cambios, columns=columnas + ['inserted'])
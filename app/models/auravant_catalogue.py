@@ -0,0 +1,180 @@
+"""
+Copia local del catálogo de campos y lotes de Auravant (respuesta de getfields).
+
+sync_catalogue() compara la respuesta con lo guardado por id y hash del
+contenido, y solo escribe las altas, cambios y bajas. load_catalogue()
+reconstruye la misma respuesta desde Postgres. El ETag del catálogo (hash de
+todos los ids + hashes) se guarda en auravant_sync y permite contestar 304
+sin leer las tablas.
+"""
+import hashlib
+import json
+import logging
+
+from psycopg2.extras import Json, execute_values
+
+from app.core.database import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Claves de la respuesta de getfields: lista de campos y, en cada campo, lista de lotes
+FIELDS_KEY = 'campos'
+LOTS_KEY = 'lotes'
+
+_UPSERT_FIELDS_SQL = """
+-- name: auravant_fields.upsert
+INSERT INTO auravant_fields (id_campo, uuid, nombre, posicion, data, content_hash)
+VALUES %s
+ON CONFLICT (id_campo) DO UPDATE
+SET uuid = EXCLUDED.uuid, nombre = EXCLUDED.nombre, posicion = EXCLUDED.posicion,
+    data = EXCLUDED.data, content_hash = EXCLUDED.content_hash, updated_at = now()
+"""
+
+_UPSERT_LOTS_SQL = """
+-- name: auravant_lots.upsert
+INSERT INTO auravant_lots (id_lote, id_campo, uuid, nombre, shape, posicion, data, content_hash)
+VALUES %s
+ON CONFLICT (id_lote) DO UPDATE
+SET id_campo = EXCLUDED.id_campo, uuid = EXCLUDED.uuid, nombre = EXCLUDED.nombre,
+    shape = EXCLUDED.shape, posicion = EXCLUDED.posicion, data = EXCLUDED.data,
+    content_hash = EXCLUDED.content_hash, updated_at = now()
+"""
+
+_SAVE_SYNC_SQL = """
+-- name: auravant_sync.save
+INSERT INTO auravant_sync (id, etag, extra, synced_at, changed_at)
+VALUES (true, %(etag)s, %(extra)s, now(), now())
+ON CONFLICT (id) DO UPDATE
+SET etag = EXCLUDED.etag, extra = EXCLUDED.extra, synced_at = now(),
+    changed_at = CASE WHEN auravant_sync.etag IS DISTINCT FROM EXCLUDED.etag
+                      THEN now() ELSE auravant_sync.changed_at END
+"""
+
+
+def _hash(data):
+    return hashlib.md5(json.dumps(data, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def _filas(payload):
+    """Respuesta de getfields → (campos, lotes, extra) como dicts id -> fila"""
+    # Una respuesta de error no debe vaciar el catálogo
+    if not isinstance(payload, dict) or FIELDS_KEY not in payload:
+        raise ValueError(f"Respuesta de getfields sin '{FIELDS_KEY}': {str(payload)[:200]}")
+    campos, lotes = {}, {}
+    for posicion, campo in enumerate(payload.get(FIELDS_KEY) or []):
+        datos = {k: v for k, v in campo.items() if k != LOTS_KEY}
+        id_campo = str(campo['id'])
+        campos[id_campo] = {
+            'id_campo': id_campo, 'uuid': campo.get('uuid'), 'nombre': campo.get('nombre'),
+            'posicion': posicion, 'data': datos, 'content_hash': _hash(datos),
+        }
+        for posicion_lote, lote in enumerate(campo.get(LOTS_KEY) or []):
+            id_lote = str(lote['id'])
+            lotes[id_lote] = {
+                'id_lote': id_lote, 'id_campo': id_campo, 'uuid': lote.get('uuid'),
+                'nombre': lote.get('nombre'), 'shape': lote.get('shape'),
+                'posicion': posicion_lote, 'data': lote, 'content_hash': _hash(lote),
+            }
+    extra = {k: v for k, v in payload.items() if k != FIELDS_KEY}
+    return campos, lotes, extra
+
+
+def _etag(campos, lotes, extra):
+    firma = sorted((k, f['content_hash'], f['posicion']) for k, f in campos.items())
+    firma += sorted((k, l['id_campo'], l['content_hash'], l['posicion']) for k, l in lotes.items())
+    return _hash([firma, extra])
+
+
+def _diff(cur, table, key, filas, columnas, comparar):
+    """Filas nuevas o cambiadas (por las columnas comparar) e ids que ya no están"""
+    cur.execute(f"SELECT {key}, {', '.join(comparar)} FROM {table}")
+    guardadas = {row[0]: row[1:] for row in cur.fetchall()}
+    cambiadas = [
+        tuple(Json(f[c]) if c == 'data' else f[c] for c in columnas)
+        for k, f in filas.items()
+        if guardadas.get(k) != tuple(f[c] for c in comparar)
+    ]
+    borradas = [k for k in guardadas if k not in filas]
+    return cambiadas, borradas, len(filas) - len(cambiadas)
+
+
+def sync_catalogue(payload):
+    """
+    Sincroniza la respuesta de getfields con auravant_fields / auravant_lots
+    en una sola transacción.
+
+    Returns:
+        dict con etag y el número de campos / lotes changed, deleted y unchanged
+    """
+    campos, lotes, extra = _filas(payload)
+    etag = _etag(campos, lotes, extra)
+    stats = {'etag': etag}
+
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cambios_campos, bajas_campos, iguales_campos = _diff(
+                    cur, 'auravant_fields', 'id_campo', campos,
+                    ['id_campo', 'uuid', 'nombre', 'posicion', 'data', 'content_hash'],
+                    ['content_hash', 'posicion'])
+                cambios_lotes, bajas_lotes, iguales_lotes = _diff(
+                    cur, 'auravant_lots', 'id_lote', lotes,
+                    ['id_lote', 'id_campo', 'uuid', 'nombre', 'shape', 'posicion', 'data', 'content_hash'],
+                    # Un lote movido a otro campo se reescribe aunque su contenido sea igual:
+                    # si no, el borrado del campo antiguo se lo llevaría por el CASCADE
+                    ['id_campo', 'content_hash', 'posicion'])
+
+                # Campos antes que lotes (FK); las bajas de campos arrastran sus lotes (ON DELETE CASCADE)
+                if cambios_campos:
+                    execute_values(cur, _UPSERT_FIELDS_SQL, cambios_campos)
+                if bajas_lotes:
+                    cur.execute("DELETE FROM auravant_lots WHERE id_lote = ANY(%s)", (bajas_lotes,))
+                if cambios_lotes:
+                    execute_values(cur, _UPSERT_LOTS_SQL, cambios_lotes)
+                if bajas_campos:
+                    cur.execute("DELETE FROM auravant_fields WHERE id_campo = ANY(%s)", (bajas_campos,))
+                cur.execute(_SAVE_SYNC_SQL, {'etag': etag, 'extra': Json(extra)})
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    stats['fields'] = {'changed': len(cambios_campos), 'deleted': len(bajas_campos), 'unchanged': iguales_campos}
+    stats['lots'] = {'changed': len(cambios_lotes), 'deleted': len(bajas_lotes), 'unchanged': iguales_lotes}
+    return stats
+
+
+def catalogue_etag():
+    """ETag del catálogo local, o None si nunca se ha sincronizado"""
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT etag FROM auravant_sync")
+            row = cur.fetchone()
+    return row[0] if row else None
+
+
+def load_catalogue():
+    """
+    Catálogo local con la misma forma que la respuesta de getfields.
+
+    Returns:
+        (payload, etag), o (None, None) si nunca se ha sincronizado
+    """
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT etag, extra FROM auravant_sync")
+            row = cur.fetchone()
+            if row is None:
+                return None, None
+            etag, extra = row
+            cur.execute("SELECT id_campo, data FROM auravant_fields ORDER BY posicion, id_campo")
+            campos = cur.fetchall()
+            cur.execute("SELECT id_campo, data FROM auravant_lots ORDER BY id_campo, posicion, id_lote")
+            lotes = cur.fetchall()
+
+    por_campo = {}
+    for id_campo, data in lotes:
+        por_campo.setdefault(id_campo, []).append(data)
+    payload = dict(extra or {})
+    payload[FIELDS_KEY] = [{**data, LOTS_KEY: por_campo.get(id_campo, [])} for id_campo, data in campos]
+    return payload, etag
@@ -0,0 +1,81 @@
+import logging
+import os
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from app.core.database import db_connection
+from app.core.partitions import ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+# Lecturas acumuladas antes de escribir; por debajo de este tamaño es un único INSERT por ciclo
+METEO_FORECAST_FLUSH_SIZE = int(os.getenv('METEO_FORECAST_FLUSH_SIZE', '1000'))
+
+COLUMNS = [
+    'uid_parcel', 'time', 'temperature', 'relative_humidity',
+    'precipitation', 'cloud_cover', 'wind_speed', 'wind_direction'
+]
+
+_INSERT_SQL = f"-- name: meteo_forecast.insert\nINSERT INTO meteo_forecast ({', '.join(COLUMNS)}) VALUES %s"
+
+
+def save_meteo_forecast(registros):
+    """
+    Inserta lecturas "current" en meteo_forecast con un INSERT multi-fila
+    y un único commit.
+
+    Args:
+        registros: lista de dicts con las claves de COLUMNS
+    """
+    if not registros:
+        return 0
+    values = [tuple(r[c] for c in COLUMNS) for r in registros]
+    horas = [pd.Timestamp(r['time']) for r in registros]
+    ensure_partitions('meteo_forecast', min(horas), max(horas))
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, _INSERT_SQL, values, page_size=len(values))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(values)
+
+
+class MeteoForecastBuffer:
+    """
+    Acumula las lecturas de un ciclo y las escribe en bloque.
+
+        with MeteoForecastBuffer() as buffer:
+            for parcela in parcelas:
+                buffer.add({...})
+
+    Se vacía al llegar a flush_size lecturas y al salir del bloque. Un error
+    de escritura se registra y descarta ese bloque, sin tumbar el job.
+    """
+
+    def __init__(self, flush_size=METEO_FORECAST_FLUSH_SIZE):
+        self.flush_size = flush_size
+        self.pendientes = []
+        self.escritas = 0
+
+    def add(self, registro):
+        self.pendientes.append(registro)
+        if len(self.pendientes) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        registros, self.pendientes = self.pendientes, []
+        try:
+            self.escritas += save_meteo_forecast(registros)
+        except Exception as e:
+            logger.error(f"Error guardando {len(registros)} lecturas en meteo_forecast: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
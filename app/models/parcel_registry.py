@@ -0,0 +1,192 @@
+import ast
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+from app.core.database import db_connection, connect_unpooled
+
+logger = logging.getLogger(__name__)
+
+# Segundos que una carga de parcels se considera válida aunque no llegue ningún NOTIFY
+PARCEL_REGISTRY_TTL = float(os.getenv('PARCEL_REGISTRY_TTL', '300'))
+# Canal del trigger trg_parcels_changed (migración 005)
+PARCELS_CHANNEL = 'parcels_changed'
+
+
+def _centroide(vertices):
+    """Centroide del polígono (fórmula del área); media de vértices si es degenerado"""
+    area = cx = cy = 0.0
+    n = len(vertices)
+    for i in range(n):
+        lat1, lon1 = vertices[i]
+        lat2, lon2 = vertices[(i + 1) % n]
+        cross = lon1 * lat2 - lon2 * lat1
+        area += cross
+        cx += (lon1 + lon2) * cross
+        cy += (lat1 + lat2) * cross
+    if abs(area) < 1e-15:
+        return (sum(v[0] for v in vertices) / n, sum(v[1] for v in vertices) / n)
+    area *= 0.5
+    return (cy / (6 * area), cx / (6 * area))
+
+
+def parse_parcela(uid_parcel, coordinates_parcel):
+    """
+    Convierte una fila de parcels en el dict que usan los pipelines.
+
+    coordinates_parcel llega como texto '[[lat, lon], ...]'. Además de las
+    columnas originales se añaden:
+        vertices  -> lista de (lat, lon)
+        lat / lon -> punto de consulta meteo (primer vértice, como hasta ahora)
+        centroid  -> (lat, lon)
+        wkt       -> 'POLYGON((lon lat, ...))' cerrado; None con menos de 3 vértices
+        bbox      -> (min_lat, min_lon, max_lat, max_lon)
+
+    Una parcela con 1 o 2 vértices sigue valiendo para meteo y alertas (solo
+    usan el primer vértice); los pipelines de polígono (Sentinel, GEE) la saltan.
+    """
+    coords = ast.literal_eval(coordinates_parcel) if isinstance(coordinates_parcel, str) else coordinates_parcel
+    vertices = [(float(lat), float(lon)) for lat, lon in coords]
+    if not vertices:
+        raise ValueError("La parcela no tiene coordenadas")
+
+    anillo = vertices if vertices[0] == vertices[-1] else vertices + [vertices[0]]
+    lats = [v[0] for v in vertices]
+    lons = [v[1] for v in vertices]
+
+    return {
+        "uid_parcel": uid_parcel,
+        "coordinates_parcel": coordinates_parcel,
+        "vertices": vertices,
+        "lat": vertices[0][0],
+        "lon": vertices[0][1],
+        "centroid": _centroide(anillo[:-1] or vertices),
+        "wkt": f"POLYGON(({', '.join(f'{lon} {lat}' for lat, lon in anillo)}))" if len(vertices) >= 3 else None,
+        "bbox": (min(lats), min(lons), max(lats), max(lons)),
+    }
+
+
+class ParcelRegistry:
+    """
+    Caché en memoria de la tabla parcels, ya parseada.
+
+    Se recarga cuando vence el TTL o cuando llega un NOTIFY por el canal
+    parcels_changed (trigger trg_parcels_changed). Las notificaciones se leen
+    sin bloquear en cada consulta, así que no hace falta ningún hilo extra.
+    """
+
+    def __init__(self, ttl=PARCEL_REGISTRY_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._parcelas = None
+        self._loaded_at = 0.0
+        self._listener = None
+
+    def get(self, id_parcela=None):
+        """Lista de parcelas parseadas (todas o solo id_parcela)"""
+        with self._lock:
+            self._poll_notifications()
+            if self._parcelas is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._load()
+
+            if id_parcela is None:
+                return list(self._parcelas.values())
+
+            parcela = self._parcelas.get(id_parcela)
+            if parcela is None:
+                # Alta reciente sin NOTIFY (p. ej. sin trigger): se busca solo esa fila
+                parcela = self._load_one(id_parcela)
+            return [parcela] if parcela else []
+
+    def invalidate(self):
+        with self._lock:
+            self._parcelas = None
+
+    def _listen(self):
+        if self._listener is not None:
+            return
+        try:
+            conn = connect_unpooled()
+            conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {PARCELS_CHANNEL}")
+            self._listener = conn
+        except psycopg2.Error as e:
+            logger.warning(f"⚠️ LISTEN {PARCELS_CHANNEL} no disponible, solo TTL: {e}")
+
+    def _poll_notifications(self):
+        if self._listener is None:
+            return
+        try:
+            self._listener.poll()
+            if self._listener.notifies:
+                self._listener.notifies.clear()
+                self._parcelas = None
+        except psycopg2.Error:
+            # Conexión perdida: pueden haberse perdido avisos, se recarga y se vuelve a escuchar
+            try:
+                self._listener.close()
+            except psycopg2.Error:
+                pass
+            self._listener = None
+            self._parcelas = None
+
+    def _query(self, id_parcela=None):
+        query = """
+            -- name: parcels.registry
+            SELECT uid_parcel, coordinates_parcel
+            FROM parcels
+        """
+        params = []
+        if id_parcela is not None:
+            query += " WHERE uid_parcel = %s"
+            params.append(id_parcela)
+
+        with db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall()
+
+        parcelas = {}
+        sin_poligono = []
+        for row in rows:
+            try:
+                parcela = parcelas[row["uid_parcel"]] = parse_parcela(row["uid_parcel"], row["coordinates_parcel"])
+            except (ValueError, SyntaxError, TypeError) as e:
+                logger.error(f"❌ Coordenadas inválidas en parcela {row['uid_parcel']}: {e}")
+                continue
+            if parcela["wkt"] is None:
+                sin_poligono.append(row["uid_parcel"])
+        if sin_poligono:
+            logger.warning(f"⚠️ Parcelas con menos de 3 vértices (solo meteo/alertas, sin Sentinel/GEE): {sin_poligono}")
+        return parcelas
+
+    def _load(self):
+        # LISTEN antes del SELECT: un cambio entre ambos no se pierde
+        self._listen()
+        self._parcelas = self._query()
+        self._loaded_at = time.monotonic()
+        logger.info(f"📍 Registro de parcelas cargado: {len(self._parcelas)} parcelas")
+
+    def _load_one(self, id_parcela):
+        parcela = self._query(id_parcela).get(id_parcela)
+        if parcela is not None:
+            self._parcelas[id_parcela] = parcela
+        return parcela
+
+
+registry = ParcelRegistry()
+
+
+def get_parcelas(id_parcela=None):
+    """Parcelas desde el registro compartido (sin consultar BBDD si la caché es válida)"""
+    try:
+        return registry.get(id_parcela)
+    except psycopg2.Error as e:
+        print(f"Error en get_parcelas: {e}")
+        return []
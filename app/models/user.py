@@ -1,14 +1,13 @@
 from sqlalchemy import Column, Integer, String  # ← Quita Base
 # from app.core.database import Base  # ← ELIMINA ESTA LÍNEA
-from app.core.database import get_db_connection
+from app.core.database import db_connection
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import hashlib  # ✅ Para hashear contraseña
 
 # ✅ Mantén SOLO las funciones:
 def verify_user_credentials(email: str, password: str):
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         # ✅ HASHEAR la contraseña que viene del login ANTES de comparar
         password_hash = hashlib.sha256(password.encode()).hexdigest()
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -17,6 +16,4 @@ def verify_user_credentials(email: str, password: str):
                 FROM usuarios 
                 WHERE email = %s AND password_hash = %s
             """, (email, password_hash))  # ✅ Ahora sí coincide
-            return cur.fetchone()
-    finally:
-        conn.close()
\ No newline at end of file
+            return cur.fetchone()
\ No newline at end of file
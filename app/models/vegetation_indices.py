@@ -0,0 +1,97 @@
+import logging
+import os
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from app.core.database import db_connection, filtro_parcelas_fechas
+
+logger = logging.getLogger(__name__)
+
+# Filas por sentencia INSERT ... VALUES en el upsert
+VEGETATION_PAGE_SIZE = int(os.getenv('VEGETATION_PAGE_SIZE', '5000'))
+
+INDEX_COLUMNS = ['ndvi', 'gndvi', 'ndwi', 'savi']
+
+# ON CONFLICT usa la clave única (uid_parcel, fecha) creada en la migración 004
+_UPSERT_SQL = f"""
+-- name: parcel_vegetation_indices.upsert
+INSERT INTO parcel_vegetation_indices AS p (uid_parcel, fecha, {', '.join(INDEX_COLUMNS)})
+VALUES %s
+ON CONFLICT (uid_parcel, fecha) DO UPDATE
+SET {', '.join(f'{c} = EXCLUDED.{c}' for c in INDEX_COLUMNS)}
+WHERE ({', '.join(f'p.{c}' for c in INDEX_COLUMNS)})
+      IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in INDEX_COLUMNS)})
+RETURNING (xmax = 0) AS inserted
+"""
+
+def save_indices_to_db(df: pd.DataFrame, page_size: int = VEGETATION_PAGE_SIZE) -> dict:
+    """
+    Upsert de índices de vegetación por (uid_parcel, fecha).
+
+    Las filas nuevas se insertan, las existentes se actualizan solo si algún
+    índice cambió. Varias imágenes del mismo día para una parcela se
+    promedian antes de escribir.
+
+    Returns:
+        dict con el número de filas inserted / updated / unchanged
+    """
+    totales = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    if df.empty:
+        logger.info("⚠️ DataFrame vacío. Nada que insertar.")
+        return totales
+
+    datos = (
+        df.rename(columns={'Field': 'uid_parcel', 'Fecha': 'fecha', 'NDVI': 'ndvi',
+                           'GNDVI': 'gndvi', 'NDWI': 'ndwi', 'SAVI': 'savi'})
+        .groupby(['uid_parcel', 'fecha'], as_index=False)[INDEX_COLUMNS]
+        .mean()
+    )
+    datos = datos.astype(object).where(datos.notna(), None)
+    values = list(datos[['uid_parcel', 'fecha'] + INDEX_COLUMNS].itertuples(index=False, name=None))
+
+    try:
+        with db_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    escritas = execute_values(cur, _UPSERT_SQL, values, page_size=page_size, fetch=True)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        logger.error(f"❌ Error insertando índices en DB: {e}")
+        return totales
+
+    totales['inserted'] = sum(1 for (inserted,) in escritas if inserted)
+    totales['updated'] = len(escritas) - totales['inserted']
+    totales['unchanged'] = len(values) - len(escritas)
+    logger.info(f"✅ parcel_vegetation_indices: {totales}")
+    return totales
+
+
+def read_soil_from_db(parcelas=None, desde=None, hasta=None) -> pd.DataFrame:
+    """Índices de vegetación de las parcelas y fechas pedidas, con los nombres del pipeline de sequía"""
+    where, params = filtro_parcelas_fechas('fecha', parcelas, desde, hasta)
+    query = f'''
+    -- name: parcel_vegetation_indices.drought_soil
+    SELECT 
+        fecha as "Fecha",
+        uid_parcel as "Field", 
+        ndvi as "NDVI",
+        gndvi as "GNDVI", 
+        ndwi as "NDWI", 
+        savi as "SAVI"
+    FROM public.parcel_vegetation_indices
+    {where}
+    ORDER BY uid_parcel, fecha
+    '''
+
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            soil_df = pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
+    soil_df['Fecha'] = pd.to_datetime(soil_df['Fecha'])
+    for col in ['NDVI', 'GNDVI', 'NDWI', 'SAVI']:
+        soil_df[col] = pd.to_numeric(soil_df[col])
+    return soil_df
@@ -0,0 +1,134 @@
+import io
+import os
+
+import pandas as pd
+
+from app.core.database import DB_STREAM_CHUNK_ROWS, db_connection, filtro_parcelas_fechas, stream_frames
+from app.core.partitions import ensure_partitions
+
+# Filas por COPY + merge; cada lote se fusiona dentro de la misma transacción
+WEATHER_ARCHIVE_BATCH_SIZE = int(os.getenv('WEATHER_ARCHIVE_BATCH_SIZE', '50000'))
+
+KEY_COLUMNS = ['uid_parcel', 'time']
+VALUE_COLUMNS = ['temp_max', 'temp_min', 'rain', 'humidity_mean', 'humidity_min', 'humidity_max']
+COLUMNS = KEY_COLUMNS + VALUE_COLUMNS
+
+_STAGING_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS _stg_weather_archive ON COMMIT DROP AS
+SELECT {', '.join(COLUMNS)} FROM weather_archive WITH NO DATA
+"""
+
+_COPY_SQL = f"COPY _stg_weather_archive ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Un único INSERT ... ON CONFLICT sobre la PK (uid_parcel, time): inserta las claves nuevas y
+# actualiza las existentes solo si algún valor cambió. Es atómico frente a otro writer
+# concurrente (histMeteoUnic y histMeteoTask a la vez): nunca duplica ni choca con la PK.
+# xmax no se puede leer en tablas particionadas: inserted/updated se cuentan contra las claves
+# que ya existían en el snapshot de la sentencia (solo para las estadísticas).
+_MERGE_SQL = f"""
+-- name: weather_archive.merge
+WITH previas AS (
+    SELECT s.uid_parcel, s.time
+    FROM _stg_weather_archive s
+    JOIN weather_archive w ON w.uid_parcel = s.uid_parcel AND w.time = s.time
+), escritas AS (
+    INSERT INTO weather_archive AS w ({', '.join(COLUMNS)})
+    SELECT {', '.join(COLUMNS)} FROM _stg_weather_archive
+    ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE
+    SET {', '.join(f'{c} = EXCLUDED.{c}' for c in VALUE_COLUMNS)}
+    WHERE ({', '.join(f'w.{c}' for c in VALUE_COLUMNS)})
+          IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in VALUE_COLUMNS)})
+    RETURNING w.uid_parcel, w.time
+)
+SELECT
+    count(*) FILTER (WHERE p.uid_parcel IS NULL),
+    count(*) FILTER (WHERE p.uid_parcel IS NOT NULL)
+FROM escritas e
+LEFT JOIN previas p ON p.uid_parcel = e.uid_parcel AND p.time = e.time
+"""
+
+
+def _to_archive_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Frame del pipeline (field, time, ...) → columnas de weather_archive, una fila por (uid_parcel, día)"""
+    datos = pd.DataFrame({
+        'uid_parcel': df['field'],
+        'time': pd.to_datetime(df['time']).dt.date,
+        **{c: df[c] for c in VALUE_COLUMNS}
+    })
+    return datos.drop_duplicates(KEY_COLUMNS, keep='last')
+
+
+def save_meteo_histo(df: pd.DataFrame, batch_size: int = WEATHER_ARCHIVE_BATCH_SIZE) -> dict:
+    """
+    Carga masiva en weather_archive por clave natural (uid_parcel, time).
+
+    Cada lote se vuelca con COPY a una tabla temporal y se fusiona en una sola
+    sentencia: claves nuevas → INSERT, claves existentes con valores distintos
+    → UPDATE, el resto no se toca.
+
+    Returns:
+        dict con el número de filas inserted / updated / unchanged
+    """
+    totales = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    if df.empty:
+        return totales
+
+    datos = _to_archive_frame(df)
+    ensure_partitions('weather_archive', datos['time'].min(), datos['time'].max())
+
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_STAGING_SQL)
+                for inicio in range(0, len(datos), batch_size):
+                    lote = datos.iloc[inicio:inicio + batch_size]
+
+                    buffer = io.StringIO()
+                    lote.to_csv(buffer, index=False, header=False)
+                    buffer.seek(0)
+                    cur.copy_expert(_COPY_SQL, buffer)
+
+                    cur.execute(_MERGE_SQL)
+                    insertadas, actualizadas = cur.fetchone()
+                    cur.execute("TRUNCATE _stg_weather_archive")
+
+                    totales['inserted'] += insertadas
+                    totales['updated'] += actualizadas
+                    totales['unchanged'] += len(lote) - insertadas - actualizadas
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    print(f"{len(datos)} registros procesados en weather_archive: {totales}")
+    return totales
+
+
+def stream_climate_from_db(parcelas=None, desde=None, hasta=None, chunk_rows=DB_STREAM_CHUNK_ROWS):
+    """
+    Lee weather_archive por bloques de parcelas completas (cursor de servidor),
+    ordenados por (uid_parcel, time), para no cargar todo el histórico de golpe.
+    Columnas con los nombres del pipeline de sequía (field, time, ...).
+    """
+    where, params = filtro_parcelas_fechas('"time"', parcelas, desde, hasta)
+    query = f'''
+    -- name: weather_archive.drought_stream
+    SELECT 
+        "time", 
+        temp_max as "temperature_2m_max", 
+        temp_min as "temperature_2m_min", 
+        rain as "precipitation_sum", 
+        humidity_mean as "humidity_mean", 
+        humidity_min as "humidity_min", 
+        humidity_max as "humidity_max", 
+        uid_parcel as "field"
+    FROM public.weather_archive
+    {where}
+    ORDER BY uid_parcel, "time"
+    '''
+
+    for climate_df in stream_frames(query, params, group_column='field', chunk_rows=chunk_rows):
+        climate_df['time'] = pd.to_datetime(climate_df['time'])
+        for col in climate_df.columns.drop(['time', 'field']):
+            climate_df[col] = pd.to_numeric(climate_df[col])
+        yield climate_df
@@ -0,0 +1,105 @@
+"""
+Benchmark del SPI: bucle original por parcela vs app.core.drought (una pasada).
+
+    python -m benchmarks.spi_benchmark                # 50 parcelas, 1/5/10/20 años
+    python -m benchmarks.spi_benchmark --parcelas 200 --anios 1 10
+
+Comprueba además que ambos dan el mismo resultado (tolerancia 1e-9) y aborta
+si no es así; el test equivalente está en tests/test_drought.py.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core.drought import SPI_SCALES, add_spi
+
+
+def calculate_spi_bucle(precipitation_series, scale=30):
+    """Implementación original (O(n·scale) por parcela), como referencia"""
+    spi_values = []
+    for i in range(len(precipitation_series)):
+        if i < scale:
+            spi_values.append(np.nan)
+        else:
+            window = precipitation_series[i - scale:i]
+            mean = np.mean(window)
+            std = np.std(window)
+            spi = (precipitation_series[i] - mean) / std if std > 0 else 0
+            spi_values.append(spi)
+    return spi_values
+
+
+def historico_sintetico(parcelas, anios, seed=0):
+    """Lluvia diaria tipo (70 % días secos, resto gamma) ordenada por (field, time)"""
+    rng = np.random.default_rng(seed)
+    dias = pd.date_range('2000-01-01', periods=365 * anios, freq='D')
+    n = len(dias) * parcelas
+    lluvia = np.where(rng.random(n) < 0.7, 0.0, rng.gamma(0.8, 6.0, n)).round(1)
+    return pd.DataFrame({
+        'field': np.repeat([f'parcela_{i:04d}' for i in range(parcelas)], len(dias)),
+        'time': np.tile(dias, parcelas),
+        'precipitation_sum': lluvia,
+    })
+
+
+def ventanas_constantes(df, scale, column='precipitation_sum', group='field'):
+    """Filas cuya ventana anterior de scale días tiene todos los valores iguales"""
+    anterior = df.groupby(group, sort=False)[column].shift(1)
+    ventana = anterior.groupby(df[group], sort=False).rolling(scale, min_periods=scale)
+    return (ventana.max() == ventana.min()).to_numpy()
+
+
+def comprobar_iguales(bucle, vector, df, scale):
+    """
+    Falla (AssertionError) si las dos implementaciones difieren.
+
+    Única diferencia admitida: en ventanas constantes np.std devuelve ruido
+    (~1e-17) en vez de 0 y el bucle da valores enormes; la versión vectorizada
+    da 0, que es lo que define std 0. Esas filas se comprueban aparte.
+    """
+    bucle = np.asarray(bucle, dtype=float)
+    constantes = ventanas_constantes(df, scale)
+    np.testing.assert_array_equal(vector[constantes], 0.0)
+    np.testing.assert_allclose(vector[~constantes], bucle[~constantes], rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def medir(df, scale):
+    inicio = time.perf_counter()
+    bucle = np.concatenate([
+        calculate_spi_bucle(g['precipitation_sum'].values, scale=scale)
+        for _, g in df.groupby('field', sort=False)
+    ])
+    t_bucle = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vector = add_spi(df.copy(), scales=(scale,))[f'SPI_{scale}'].to_numpy()
+    t_vector = time.perf_counter() - inicio
+
+    comprobar_iguales(bucle, vector, df, scale)
+    return t_bucle, t_vector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parcelas', type=int, default=50)
+    parser.add_argument('--anios', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--scale', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"SPI_{args.scale}, {args.parcelas} parcelas")
+    print(f"{'años':>5} {'filas':>12} {'bucle (s)':>10} {'vector (s)':>11} {'x':>7}")
+    for anios in args.anios:
+        df = historico_sintetico(args.parcelas, anios)
+        t_bucle, t_vector = medir(df, args.scale)
+        print(f"{anios:>5} {len(df):>12,} {t_bucle:>10.2f} {t_vector:>11.3f} {t_bucle / t_vector:>7.0f}")
+
+    df = historico_sintetico(args.parcelas, max(args.anios))
+    inicio = time.perf_counter()
+    add_spi(df, scales=SPI_SCALES)
+    print(f"\nSPI {'/'.join(map(str, SPI_SCALES))} a la vez sobre {len(df):,} filas: {time.perf_counter() - inicio:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
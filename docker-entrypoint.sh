@@ -5,6 +5,11 @@ mkdir -p /app/logs
 
 echo "🚀 Iniciando AgroSync + MeteoTask + AlertasTask..."
 
+# 0. Esquema de BBDD al día antes de arrancar nada (y retención de particiones)
+echo "🛠️  Aplicando migraciones..."
+python -u -m app.core.migrations upgrade
+python -u -m app.core.migrations prune
+
 # 1. Inicia meteoTask.py EN SEGUNDO PLANO
 echo "🌦️  Iniciando MeteoTask Forecast..."
 python -u /app/app/ProgramedJobs/meteoTask.py &
@@ -31,15 +36,23 @@ ALERTAS_PID=$!
 echo $ALERTAS_PID > /tmp/alertas.pid
 
 
-# 5. Espera que todos arranquen
+# 5. Inicia auravantSyncTask.py EN SEGUNDO PLANO
+echo "🔄 Iniciando AuravantSyncTask..."
+python -u /app/app/ProgramedJobs/auravantSyncTask.py &
+AURAVANT_SYNC_PID=$!
+echo $AURAVANT_SYNC_PID > /tmp/auravantSync.pid
+
+
+# 6. Espera que todos arranquen
 sleep 5
 
 echo "✅ MeteoTask PID: $METEO_PID"
 echo "✅ histVegetaTask PID: $HIST_VEGETA_PID"
 echo "✅ histMeteoTask PID: $HIST_METEO_PID"
 echo "✅ AlertasTask PID: $ALERTAS_PID"
+echo "✅ AuravantSyncTask PID: $AURAVANT_SYNC_PID"
 echo "🌤️ MeteoTask + histVegetaTask + histMeteoTask + AlertasTask  corriendo en background"
 echo "🔥 Iniciando Flask en puerto 8282..."
 
-# 4. Flask en PRIMER PLANO
-exec python -u app/main.py
+# 4. Flask en PRIMER PLANO (la API atiende en varios hilos: puede mantener más conexiones ociosas)
+DB_POOL_MIN="${API_DB_POOL_MIN:-${DB_POOL_MIN:-1}}" exec python -u app/main.py
@@ -0,0 +1,100 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.alert_rules import ALERT_LEVELS, ALERT_RULES, add_alerts, alerts_to_records
+
+
+# Funciones fila a fila originales (alertasUnic.py), como referencia
+
+def riesgo_helada(row):
+    score = 0
+    if row["temp_min"] <= 0:
+        score += 2
+    elif row["temp_min"] <= 2:
+        score += 1
+    if row["temp_7d_mean"] <= 5:
+        score += 1
+    if score >= 3:
+        return "ALTO"
+    elif score == 2:
+        return "MEDIO"
+    else:
+        return None
+
+
+def riesgo_inundacion(row):
+    score = 0
+    if row["rain_3d_sum"] >= 40:
+        score += 2
+    elif row["rain_3d_sum"] >= 20:
+        score += 1
+    if row["rain_7d_sum"] >= 80:
+        score += 1
+    if row["humidity_mean"] >= 85:
+        score += 1
+    if score >= 3:
+        return "ALTO"
+    elif score == 2:
+        return "MEDIO"
+    else:
+        return None
+
+
+def riesgo_plaga(row):
+    score = 0
+    if row["humidity_3d_mean"] >= 80:
+        score += 1
+    if 15 <= row["temp_7d_mean"] <= 28:
+        score += 1
+    if row["rain_3d_sum"] >= 5:
+        score += 1
+    if score == 3:
+        return "ALTO"
+    elif score == 2:
+        return "MEDIO"
+    else:
+        return None
+
+
+REFERENCIA = {
+    'alerta_helada': riesgo_helada,
+    'alerta_inundacion': riesgo_inundacion,
+    'alerta_plaga': riesgo_plaga,
+}
+
+# Umbrales exactos, sus vecinos y NaN por columna
+FRONTERAS = {
+    'temp_min': [-0.1, 0, 0.1, 1.9, 2, 2.1, np.nan],
+    'temp_7d_mean': [4.9, 5, 5.1, 14.9, 15, 28, 28.1, np.nan],
+    'rain_3d_sum': [4.9, 5, 19.9, 20, 39.9, 40, np.nan],
+    'rain_7d_sum': [79.9, 80, np.nan],
+    'humidity_mean': [84.9, 85, np.nan],
+    'humidity_3d_mean': [79.9, 80, np.nan],
+}
+
+
+def _fixture():
+    """Todas las combinaciones de fronteras, repartidas en varias parcelas"""
+    df = pd.DataFrame(list(itertools.product(*FRONTERAS.values())), columns=list(FRONTERAS))
+    df.insert(0, 'uid_parcel', [f'p{i % 7}' for i in range(len(df))])
+    return df
+
+
+@pytest.mark.parametrize('columna', list(ALERT_RULES))
+def test_alertas_iguales_que_funciones_por_fila(columna):
+    df = _fixture()
+    esperado = df.apply(REFERENCIA[columna], axis=1)
+
+    obtenido = alerts_to_records(add_alerts(df.copy()))[columna]
+
+    pd.testing.assert_series_equal(obtenido, esperado.astype(object), check_names=False)
+
+
+def test_alertas_categoricas_ordenadas():
+    df = add_alerts(_fixture())
+
+    assert df['alerta_helada'].dtype == ALERT_LEVELS
+    assert set(df['alerta_helada'].dropna().unique()) == {'MEDIO', 'ALTO'}
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import drought
+
+
+def _frame(tamanos):
+    return pd.DataFrame({'field': np.repeat([f'p{i}' for i in range(len(tamanos))], tamanos)})
+
+
+@pytest.mark.parametrize('tamanos, workers', [
+    ([100, 100, 100], 4),   # más workers que parcelas
+    ([100, 100, 800], 2),   # última parcela mayor que len / workers
+])
+def test_shards_parcelas_completas(tamanos, workers):
+    df = _frame(tamanos)
+    trozos = drought._shards(df, workers)
+
+    assert sum(len(t) for t in trozos) == len(df)
+    assert len(trozos) <= workers
+    campos = [set(t['field']) for t in trozos]
+    for a in range(len(campos)):
+        for b in range(a + 1, len(campos)):
+            assert not campos[a] & campos[b]
+
+
+def test_climate_chunk_rows():
+    assert drought.climate_chunk_rows(1) == drought.DB_STREAM_CHUNK_ROWS
+    assert drought.climate_chunk_rows(4) >= drought.DROUGHT_PARALLEL_MIN_ROWS
+
+
+def _spi_bucle(precipitation_series, scale=30):
+    """calculate_spi original (alertasUnic.py), como referencia"""
+    spi_values = []
+    for i in range(len(precipitation_series)):
+        if i < scale:
+            spi_values.append(np.nan)
+        else:
+            window = precipitation_series[i - scale:i]
+            mean = np.mean(window)
+            std = np.std(window)
+            spi = (precipitation_series[i] - mean) / std if std > 0 else 0
+            spi_values.append(spi)
+    return spi_values
+
+
+def _historico(parcelas=4, dias=120, seed=1):
+    rng = np.random.default_rng(seed)
+    n = parcelas * dias
+    lluvia = np.where(rng.random(n) < 0.6, 0.0, rng.gamma(0.8, 6.0, n)).round(1)
+    lluvia[rng.choice(n, 15, replace=False)] = np.nan
+    df = pd.DataFrame({
+        'field': np.repeat([f'p{i}' for i in range(parcelas)], dias),
+        'time': np.tile(pd.date_range('2024-01-01', periods=dias, freq='D'), parcelas),
+        'precipitation_sum': lluvia,
+    })
+    # Parcela corta (menos días que la escala) y una con sequía total
+    corta = pd.DataFrame({'field': 'corta', 'time': pd.date_range('2024-01-01', periods=10, freq='D'),
+                          'precipitation_sum': 1.0})
+    seca = pd.DataFrame({'field': 'seca', 'time': pd.date_range('2024-01-01', periods=60, freq='D'),
+                         'precipitation_sum': 0.0})
+    return pd.concat([df, corta, seca], ignore_index=True)
+
+
+@pytest.mark.parametrize('scale', [30, 60])
+def test_spi_igual_que_bucle_original(scale):
+    df = _historico()
+    esperado = np.concatenate([
+        _spi_bucle(g['precipitation_sum'].to_numpy(), scale)
+        for _, g in df.groupby('field', sort=False)
+    ]).astype(float)
+
+    obtenido = drought.add_spi(df.copy(), scales=(scale,))[f'SPI_{scale}'].to_numpy()
+
+    np.testing.assert_allclose(obtenido, esperado, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_spi_ventana_constante_es_cero():
+    # np.std de una ventana constante no nula da ~1e-17 y el bucle original
+    # devolvía valores enormes; std 0 → SPI 0 por definición
+    df = pd.DataFrame({'field': 'p', 'precipitation_sum': [0.1] * 30 + [0.5]})
+
+    assert drought.add_spi(df, scales=(30,))['SPI_30'].iloc[-1] == 0.0
@@ -0,0 +1,137 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from app.api.alertasUnic import apply_final_drought_logic, merge_climate_soil
+from app.core.drought import SEVERITY_LEVELS
+
+
+def _merge_bucle(climate_final, soil_df):
+    """merge_climate_soil original (iterrows por parcela), como referencia; ffill por parcela"""
+    merged_rows = []
+    climate_final = climate_final.assign(drought_soil_based=np.nan, drought_binary_soil=np.nan)
+
+    for field in climate_final['field'].unique():
+        climate_field = climate_final[climate_final['field'] == field].copy()
+        soil_field = soil_df[soil_df['Field'] == field].copy()
+
+        for idx, row in climate_field.iterrows():
+            date = row['time']
+            soil_match = soil_field[abs((soil_field['Fecha'] - date).dt.days) <= 5]
+            if not soil_match.empty:
+                closest_idx = abs((soil_match['Fecha'] - date).dt.days).idxmin()
+                soil_row = soil_field.loc[closest_idx]
+                climate_field.loc[idx, 'drought_soil_based'] = soil_row['drought_soil_based']
+                climate_field.loc[idx, 'drought_binary_soil'] = soil_row['drought_binary_soil']
+
+        merged_rows.append(climate_field)
+
+    merged = pd.concat(merged_rows, ignore_index=True)
+    columnas = merged.columns.drop('field')
+    merged[columnas] = merged.groupby('field')[columnas].ffill()
+    return merged
+
+
+def _clima(campos, dias=30):
+    fechas = pd.date_range('2024-03-01', periods=dias, freq='D')
+    df = pd.DataFrame({
+        'field': np.repeat(campos, dias),
+        'time': np.tile(fechas, len(campos)),
+        'drought_severity': np.tile(np.arange(dias) % 4, len(campos)).astype(float),
+    })
+    df.loc[df.index % 11 == 0, 'drought_severity'] = np.nan
+    return df
+
+
+def _suelo(filas):
+    return pd.DataFrame(filas, columns=['Field', 'Fecha', 'drought_soil_based', 'drought_binary_soil'])
+
+
+def test_merge_igual_que_bucle_original():
+    clima = _clima(['a', 'b', 'c', 'd'])
+    base = pd.Timestamp('2024-03-10')
+    suelo = _suelo([
+        # a: fechas a exactamente -5 y +5 días del 15 y a 6 días de los extremos
+        ('a', base, 1, 1),
+        ('a', base + pd.Timedelta(days=10), 2, 1),
+        ('a', base + pd.Timedelta(days=16), 0, 0),
+        # b: empate a ±3 días (gana la anterior) y fecha repetida (gana la primera)
+        ('b', base, 2, 1),
+        ('b', base + pd.Timedelta(days=6), 0, 0),
+        ('b', base + pd.Timedelta(days=6), 1, 1),
+        # c: valor de suelo NaN
+        ('c', base, np.nan, 0),
+        # d sin datos de suelo; e solo en suelo
+        ('e', base, 2, 1),
+    ])
+    suelo['Fecha'] = pd.to_datetime(suelo['Fecha'])
+
+    esperado = _merge_bucle(clima, suelo)
+    obtenido = merge_climate_soil(clima, suelo)
+
+    pd.testing.assert_frame_equal(obtenido, esperado[obtenido.columns])
+
+
+def test_merge_ffill_no_cruza_parcelas():
+    # Cambio intencionado respecto al ffill global original: 'b' no tiene suelo
+    # y no hereda el último valor de 'a'
+    clima = _clima(['a', 'b'], dias=10)
+    suelo = _suelo([('a', pd.Timestamp('2024-03-10'), 2, 1)])
+
+    merged = merge_climate_soil(clima, suelo)
+
+    assert (merged.loc[merged['field'] == 'a', 'drought_soil_based'].iloc[-5:] == 2).all()
+    assert merged.loc[merged['field'] == 'b', 'drought_soil_based'].isna().all()
+
+
+def _final_fila_a_fila(df):
+    """apply_final_drought_logic original (severity_label y drought_confidence por fila), como referencia"""
+    df['soil_severity_scaled'] = df['drought_soil_based'].map({0: 0, 1: 2, 2: 3}).fillna(0)
+    df['severity_numeric'] = df[['drought_severity', 'soil_severity_scaled']].max(axis=1)
+
+    def severity_label(value):
+        if value <= 1:
+            return 'Mild'
+        elif value == 2:
+            return 'Moderate'
+        else:
+            return 'Severe'
+
+    df['severity'] = df['severity_numeric'].apply(severity_label)
+    df['drought_risk'] = np.where((df['drought_binary_SPI'] == 1) | (df['drought_binary_soil'] == 1), 'High', 'Low')
+
+    def drought_confidence(row):
+        score = 0
+        if row['drought_binary_SPI'] == 1:
+            score += 40
+        if row['drought_binary_soil'] == 1:
+            score += 40
+        if row['severity'] == 'Moderate':
+            score += 10
+        elif row['severity'] == 'Severe':
+            score += 20
+        return min(score, 100)
+
+    df['drought_confidence'] = df.apply(drought_confidence, axis=1)
+    return df
+
+
+def test_severidad_y_confianza_iguales_que_por_fila():
+    combinaciones = itertools.product(
+        [0, 1, 1.5, 2, 2.5, 3, np.nan],    # drought_severity
+        [0, 1, 2, 3, np.nan],              # drought_soil_based (3 fuera del mapeo)
+        [0, 1, np.nan],                    # drought_binary_SPI
+        [0, 1, np.nan],                    # drought_binary_soil
+    )
+    df = pd.DataFrame(list(combinaciones), columns=[
+        'drought_severity', 'drought_soil_based', 'drought_binary_SPI', 'drought_binary_soil'
+    ])
+    df.insert(0, 'field', [f'p{i % 5}' for i in range(len(df))])
+
+    esperado = _final_fila_a_fila(df.copy())
+    obtenido = apply_final_drought_logic(df.copy())
+
+    assert obtenido['severity'].dtype == SEVERITY_LEVELS
+    obtenido['severity'] = obtenido['severity'].astype(object)
+    pd.testing.assert_frame_equal(obtenido, esperado)
@@ -0,0 +1,59 @@
+from app.core import open_meteo
+
+URL = 'https://example.test/v1/forecast'
+
+PARCELAS = [
+    {'uid_parcel': 'a', 'lat': 40.01, 'lon': -3.01},
+    {'uid_parcel': 'b', 'lat': 40.02, 'lon': -3.02},
+    {'uid_parcel': 'c', 'lat': 40.01, 'lon': -3.01},
+    {'uid_parcel': 'd', 'lat': 41.0, 'lon': -3.0},
+]
+
+
+def test_grid_cells_agrupa_coordenadas_identicas():
+    celdas, mapping = open_meteo.grid_cells(PARCELAS, step=0, url=URL + '/nueva')
+
+    assert len(celdas) == 3
+    assert sorted(mapping.values()) == [['a', 'c'], ['b'], ['d']]
+    assert open_meteo.dedupe_ratio(mapping) == 0.25
+
+
+def test_grid_cells_agrupa_por_celda_del_modelo():
+    celdas, _ = open_meteo.grid_cells(PARCELAS, step=0, url=URL)
+    # Open-Meteo responde con las coordenadas de la celda del modelo
+    respuestas = {
+        c['uid_parcel']: {'latitude': round(c['lat']), 'longitude': round(c['lon']), 'elevation': 600.0}
+        for c in celdas
+    }
+    open_meteo._aprender_celdas(URL, celdas, respuestas)
+
+    celdas, mapping = open_meteo.grid_cells(PARCELAS, step=0, url=URL)
+
+    assert len(celdas) == 2
+    assert sorted(mapping.values()) == [['a', 'b', 'c'], ['d']]
+    assert open_meteo.dedupe_ratio(mapping) == 0.5
+
+
+def test_fetch_daily_forecast_sin_respuestas(monkeypatch):
+    async def sin_respuestas(*args, **kwargs):
+        return {}
+    monkeypatch.setattr(open_meteo, '_fetch_cells', sin_respuestas)
+
+    df, mapping = open_meteo.fetch_daily_forecast(PARCELAS, por_celda=True)
+
+    assert df.empty
+    assert list(df.columns) == open_meteo.DAILY_FORECAST_COLUMNS
+    assert open_meteo.fetch_daily_forecast([]).empty
+
+
+def test_fetch_archive_sin_respuestas(monkeypatch):
+    async def sin_respuestas(*args, **kwargs):
+        return {}
+    monkeypatch.setattr(open_meteo, '_fetch_cells', sin_respuestas)
+    monkeypatch.setattr(open_meteo, 'archive_cache', None)
+
+    df = open_meteo.fetch_archive(PARCELAS, '2024-01-01', '2024-02-15')
+
+    assert df.empty
+    assert list(df.columns) == open_meteo.ARCHIVE_COLUMNS
+    assert str(df['time'].dtype) == 'datetime64[ns]'